@@ -0,0 +1,40 @@
+"""
+Request bodies of Dash callback updates, as the browser sends them to /_dash-update-component.
+Shared by the benchmark suite (Flask test client) and the load test (HTTP).
+"""
+
+
+def find_dependency(dependencies, output_prefix):
+    """
+    Find a callback in the list returned by /_dash-dependencies.
+    Parameters:
+        dependencies (list): The callback definitions of the app.
+        output_prefix (str): Start of the output key of the callback, e.g. 'hierarchy-treemap.figure'
+            or '..line-chart.figure' for a callback with several outputs.
+    """
+    for dependency in dependencies:
+        if dependency['output'].startswith(output_prefix):
+            return dependency
+    raise KeyError(f"No callback with output {output_prefix}")
+
+
+def update_request_body(dependency, values, changed):
+    """
+    Body of one update request.
+    Parameters:
+        dependency (dict): The callback, see find_dependency.
+        values (dict): 'component-id.property' -> current value of the inputs and states.
+        changed (list): 'component-id.property' of the inputs that triggered the call, empty for the initial call.
+    """
+    output = dependency['output']
+    outputs = [
+        dict(zip(('id', 'property'), key.split('.', 1)))
+        for key in output.strip('.').split('...')
+    ]
+    return {
+        'output': output,
+        'outputs': outputs if output.startswith('..') else outputs[0],
+        'inputs': [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in dependency['inputs']],
+        'state': [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in dependency['state']],
+        'changedPropIds': changed,
+    }
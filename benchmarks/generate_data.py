@@ -0,0 +1,184 @@
+"""
+Generate synthetic O2/S2/V2 source CSVs for the benchmarks.
+The units follow the RegistrationNumber scheme of the published data (NNN.NN.NNN-NN):
+    kraj '110', okres '111', stredisko '111.01', oddil '111.01.001', druzina '111.01.001-01'
+Member counts are summed bottom-up, so a parent reports its children plus its own leaders, and some
+units are founded or closed during the covered years. Scale 1 is roughly the size of the real data.
+
+Usage:
+    python benchmarks/generate_data.py --scale 10 --output benchmarks/data/scale_10
+    python benchmarks/generate_data.py --scale 10 --output data_10x --merged data_10x/merged_dataframe.csv
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AGE_GROUP_COLUMNS = ['MembersTo6', 'MembersTo15', 'MembersTo18', 'MembersTo26', 'MembersFrom26']
+SOURCE_COLUMNS = ['RegistrationNumber', 'DisplayName', 'ID_UnitType', 'RegularMembers'] + AGE_GROUP_COLUMNS
+# Source file prefix, encoding, delimiter and unit types of every dataset type
+SOURCE_FILES = {
+    'O2': ('O2_clenove_oddily', 'cp1250', ';', ['oddil', 'druzina']),
+    'S2': ('S2_clenove_strediska', 'utf-8', ',', ['stredisko']),
+    'V2': ('V2_clenove_vyssi', 'cp1250', ',', ['ustredi', 'kraj', 'okres']),
+}
+# Unit types from the root down, a unit is always deeper than its parent
+UNIT_TYPES = ['ustredi', 'kraj', 'okres', 'stredisko', 'oddil', 'druzina']
+DEFAULT_YEARS = 9  # 2016 - 2024, as in the published data
+LAST_YEAR = 2024
+KRAJ_COUNT = 14
+# Names with diacritics, so the cp1250 files are not plain ASCII
+PLACE_NAMES = ['Ústí', 'Plzeň', 'Třebíč', 'Žďár', 'Čáslav', 'Říčany', 'Šumperk', 'Kroměříž', 'Děčín', 'Jičín',
+               'Hradec', 'Tábor', 'Příbram', 'Mělník', 'Jeseník', 'Zlín', 'Vsetín', 'Beroun', 'Písek', 'Cheb']
+
+
+def generate_units(scale=1, seed=0):
+    """
+    Build the unit tree.
+    Parameters:
+        scale (float): Multiplier of the number of units. Up to 11x more strediska are added per okres
+            (the stredisko part has two digits), the rest of the factor goes to the oddily per stredisko.
+        seed (int): Seed of the random generator.
+    Returns:
+        pd.DataFrame with RegistrationNumber, DisplayName, ID_UnitType, Parent (row position, -1 for the root)
+        and Depth columns, parents before their children.
+    """
+    rng = np.random.default_rng(seed)
+    stredisko_factor = min(scale, 11)
+    oddil_factor = scale / stredisko_factor
+
+    registration_numbers, names, unit_types, parents = [], [], [], []
+
+    def add(registration_number, name, unit_type, parent):
+        registration_numbers.append(registration_number)
+        names.append(name)
+        unit_types.append(unit_type)
+        parents.append(parent)
+        return len(registration_numbers) - 1
+
+    root = add('000', 'Junák - český skaut', 'ustredi', -1)
+    for k in range(KRAJ_COUNT):
+        kraj_code = 11 + k
+        kraj = add(f"{kraj_code}0", f"Kraj {PLACE_NAMES[k % len(PLACE_NAMES)]}", 'kraj', root)
+        for o in range(1, rng.integers(4, 8) + 1):
+            okres_number = f"{kraj_code}{o}"
+            okres = add(okres_number, f"Okres {PLACE_NAMES[(k + o) % len(PLACE_NAMES)]} {o}", 'okres', kraj)
+            stredisko_count = min(99, round(rng.integers(3, 10) * stredisko_factor))
+            for s in range(1, stredisko_count + 1):
+                stredisko_number = f"{okres_number}.{s:02d}"
+                stredisko = add(stredisko_number, f"Středisko {PLACE_NAMES[(k + o + s) % len(PLACE_NAMES)]} {s}",
+                                'stredisko', okres)
+                oddil_count = min(999, max(1, round(rng.integers(1, 8) * oddil_factor)))
+                for d in range(1, oddil_count + 1):
+                    oddil_number = f"{stredisko_number}.{d:03d}"
+                    oddil = add(oddil_number, f"{d}. oddíl {PLACE_NAMES[(s + d) % len(PLACE_NAMES)]}", 'oddil', stredisko)
+                    for g in range(1, rng.integers(0, 6) + 1):
+                        add(f"{oddil_number}-{g:02d}", f"Družina {g}", 'druzina', oddil)
+
+    units = pd.DataFrame({
+        'RegistrationNumber': registration_numbers,
+        'DisplayName': names,
+        'ID_UnitType': unit_types,
+        'Parent': parents,
+    })
+    units['Depth'] = units['ID_UnitType'].map(UNIT_TYPES.index)
+    return units
+
+
+def generate_dataset(directory, scale=1, years=DEFAULT_YEARS, seed=0):
+    """
+    Write one O2, S2 and V2 CSV per year into a directory.
+    Parameters:
+        directory (str): Output directory, created if needed.
+        scale (float): Multiplier of the number of units, see generate_units.
+        years (int): Number of years, ending with LAST_YEAR.
+        seed (int): Seed of the random generator.
+    Returns:
+        int: Number of generated rows.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    units = generate_units(scale, seed)
+    unit_count = len(units)
+    parents = units['Parent'].to_numpy()
+    depths = units['Depth'].to_numpy()
+    first_year = LAST_YEAR - years + 1
+
+    # Lifetime of every unit, ~15% of the strediska, oddily and druziny are founded or closed in between.
+    # A child only exists while its parent does.
+    start = np.full(unit_count, first_year)
+    end = np.full(unit_count, LAST_YEAR)
+    churn = (depths >= UNIT_TYPES.index('stredisko')) & (rng.random(unit_count) < 0.15)
+    start[churn] = rng.integers(first_year, LAST_YEAR + 1, churn.sum())
+    end[churn] = np.maximum(start[churn], rng.integers(first_year, LAST_YEAR + 1, churn.sum()))
+    for depth in range(1, len(UNIT_TYPES)):
+        level = np.flatnonzero(depths == depth)
+        start[level] = np.maximum(start[level], start[parents[level]])
+        end[level] = np.minimum(end[level], end[parents[level]])
+
+    # Size and age profile of every unit: druziny are mostly children, the leaders counted in the
+    # parents are mostly adults
+    is_druzina = depths == UNIT_TYPES.index('druzina')
+    base_size = np.where(is_druzina, rng.integers(4, 16, unit_count), rng.integers(0, 6, unit_count))
+    child_profile = rng.dirichlet([2, 8, 3, 1, 0.2], unit_count)
+    leader_profile = rng.dirichlet([0.1, 0.1, 2, 4, 3], unit_count)
+    profiles = np.where(is_druzina[:, None], child_profile, leader_profile)
+
+    rows = 0
+    for year in range(first_year, LAST_YEAR + 1):
+        active = (start <= year) & (year <= end)
+        trend = 1 + 0.03 * (year - first_year)
+        own = np.where(active, rng.poisson(base_size * trend), 0)
+        values = rng.multinomial(own, profiles)
+
+        # Sum every level into its parent, deepest level first
+        for depth in range(len(UNIT_TYPES) - 1, 0, -1):
+            level = np.flatnonzero(depths == depth)
+            np.add.at(values, parents[level], values[level])
+
+        table = units[['RegistrationNumber', 'DisplayName', 'ID_UnitType']].copy()
+        table['RegularMembers'] = values.sum(axis=1)
+        table[AGE_GROUP_COLUMNS] = values
+        table = table[active]
+
+        for prefix, encoding, delimiter, unit_types in SOURCE_FILES.values():
+            rows_of_file = table[table['ID_UnitType'].isin(unit_types)]
+            rows_of_file[SOURCE_COLUMNS].to_csv(os.path.join(directory, f"{prefix}_{year}.csv"),
+                                                sep=delimiter, encoding=encoding, index=False)
+            rows += len(rows_of_file)
+    return rows
+
+
+def write_merged_dataframe(directory, filepath):
+    """Load the generated source CSVs with the DataLoader and write the merged dataset, as the app loads it."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from src.DataLoader import DataLoader
+
+    loader = DataLoader(directory)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.load_all_csvs()
+        loader.normalize_and_merge()
+    loader.get_merged_dataframe().to_csv(filepath, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic O2/S2/V2 source CSVs.")
+    parser.add_argument('--scale', type=float, default=1, help="Multiplier of the number of units (1, 10, 100, ...).")
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS, help="Number of years, ending with 2024.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True, help="Output directory.")
+    parser.add_argument('--merged', help="Also write the merged dataset to this CSV file, e.g. for DASHBOARD_DATA.")
+    args = parser.parse_args()
+
+    row_count = generate_dataset(args.output, args.scale, args.years, args.seed)
+    print(f"Generated {row_count} rows into {args.output}.")
+    if args.merged:
+        write_merged_dataframe(args.output, args.merged)
+        print(f"Merged dataset written to {args.merged}.")
@@ -0,0 +1,370 @@
+"""
+HTTP load test of a running dashboard.
+Every simulated session replays what a user does in the browser: it loads the page, drags the year
+slider, walks the dropdown cascade down to an oddil (sometimes by searching), clicks into the treemap
+and resets the filters. All sessions run concurrently with asyncio over keep-alive connections, the
+latency of every callback request is recorded and reported as p50/p95/p99 and throughput per callback.
+Only the standard library is used.
+
+Usage, against an app serving generated data (see generate_data.py):
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --sessions 20 --duration 60 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from urllib.parse import urlsplit
+
+from dash_requests import find_dependency, update_request_body
+
+UPDATE_PATH = '/_dash-update-component'
+# Output keys (prefixes) of the callbacks in register_callbacks
+CHARTS = '..line-chart.figure'
+DROPDOWNS = '..level0-dropdown.value...level1-dropdown.options'
+SEARCH_LEVEL2 = 'level2-dropdown.options@'
+SEARCH_LEVEL3 = 'level3-dropdown.options@'
+TREEMAP_SELECTION = '..treemap-request.data'
+TREEMAP = 'hierarchy-treemap.figure'
+RESET = '..level0-dropdown.value@'
+DROPDOWN_VALUES = [f'level{i}-dropdown.value' for i in range(4)]
+TREEMAP_REQUEST = 'treemap-request.data'
+# Names of the callback functions, used in the report
+CALLBACK_NAMES = {
+    CHARTS: 'update_charts',
+    DROPDOWNS: 'update_dropdowns',
+    SEARCH_LEVEL2: 'search_level2_options',
+    SEARCH_LEVEL3: 'search_level3_options',
+    TREEMAP_SELECTION: 'select_treemap',
+    TREEMAP: 'generate_dynamic_treemap',
+    RESET: 'reset_dropdowns',
+}
+
+
+class HttpConnection:
+    """Minimal HTTP/1.1 client on one keep-alive connection, reconnects when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        """
+        Send one request.
+        Returns:
+            (status, body bytes)
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+        self.writer.write(head.encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by the server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b''.join(chunks)
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self.reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close' or status_line.startswith(b'HTTP/1.0'):
+            await self.close()
+        return status, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+class Statistics:
+    """Latencies, errors and response sizes per callback."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = {}
+
+    def add(self, name, latency, ok, size):
+        self.latencies.setdefault(name, []).append(latency)
+        self.errors[name] = self.errors.get(name, 0) + (not ok)
+        self.bytes[name] = self.bytes.get(name, 0) + size
+
+    def report(self, duration):
+        """Summary per callback and over all requests, latencies in milliseconds."""
+        summary = {}
+        everything = []
+        for name, latencies in sorted(self.latencies.items()):
+            everything += latencies
+            summary[name] = self._summarize(latencies, duration, self.errors[name], self.bytes[name])
+        summary['total'] = self._summarize(everything, duration, sum(self.errors.values()), sum(self.bytes.values()))
+        return summary
+
+    def _summarize(self, latencies, duration, errors, size):
+        latencies = sorted(latencies)
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput': len(latencies) / duration if duration else 0,
+            'p50': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': (latencies[-1] if latencies else 0) * 1000,
+            'mean_bytes': size / len(latencies) if latencies else 0,
+        }
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list, 0 for an empty list."""
+    if not sorted_values:
+        return 0
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+def find_component(layout, component_id):
+    """Props of the component with the given id in the JSON layout returned by /_dash-layout."""
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            props = node.get('props', {})
+            if props.get('id') == component_id:
+                return props
+            stack.append(props.get('children'))
+    raise KeyError(f"Component {component_id} not found in the layout")
+
+
+class Session:
+    """One simulated user, with the current values of the controls as the browser keeps them."""
+
+    def __init__(self, connection, dependencies, layout, statistics, rng, think_time):
+        self.connection = connection
+        self.dependencies = dependencies
+        self.statistics = statistics
+        self.rng = rng
+        self.think_time = think_time
+
+        slider = find_component(layout, 'year-slider')
+        self.years = list(range(slider['min'], slider['max'] + 1))
+        self.values = {'year-slider.value': slider['value'], 'hierarchy-treemap.clickData': None,
+                       'reset-button.n_clicks': 0}
+        self.options = {}
+        for level in range(4):
+            dropdown = find_component(layout, f'level{level}-dropdown')
+            self.values[f'level{level}-dropdown.value'] = dropdown.get('value', 'ALL')
+            self.options[level] = dropdown.get('options', [])
+        self.treemap_ids = []
+
+    async def call(self, output_prefix, changed):
+        """
+        Send one callback request with the current values, apply and return its response.
+        A background callback answers with a job first, it is polled like the browser does until the
+        result is there, the latency is the time until the result.
+        """
+        dependency = find_dependency(self.dependencies, output_prefix)
+        body = update_request_body(dependency, self.values, changed)
+        name = CALLBACK_NAMES[output_prefix]
+        start = time.perf_counter()
+        size = 0
+        path = UPDATE_PATH
+        try:
+            while True:
+                status, data = await self.connection.request('POST', path, body)
+                size += len(data)
+                result = json.loads(data) if status == 200 else {}
+                if 'cacheKey' not in result:
+                    break
+                await asyncio.sleep(dependency['long']['interval'] / 1000)
+                path = f"{UPDATE_PATH}?cacheKey={result['cacheKey']}&job={result['job']}"
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            await self.connection.close()
+            self.statistics.add(name, time.perf_counter() - start, False, 0)
+            return {}
+        self.statistics.add(name, time.perf_counter() - start, status in (200, 204), size)
+
+        response = result.get('response', {})
+        for component_id, props in response.items():
+            for prop, value in props.items():
+                if isinstance(value, dict) and 'data' not in value and prop == 'figure':
+                    continue  # Patch of a figure, nothing to keep
+                prop = prop.split('@')[0]
+                if prop == 'options':
+                    self.options[int(component_id[5])] = value
+                elif prop in ('value', 'data'):
+                    self.values[f'{component_id}.{prop}'] = value
+                elif component_id == 'hierarchy-treemap':
+                    self.treemap_ids = value['data'][0].get('ids', []) if value.get('data') else []
+        return response
+
+    async def update_treemap(self, changed):
+        """Select the treemap to show, a treemap that is not cached comes from a background job."""
+        response = await self.call(TREEMAP_SELECTION, changed)
+        if 'hierarchy-treemap' not in response:
+            await self.call(TREEMAP, [TREEMAP_REQUEST])
+
+    async def think(self):
+        if self.think_time > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+    async def page_load(self):
+        """Initial calls of all callbacks, as after opening the page."""
+        for output in (DROPDOWNS, CHARTS):
+            await self.call(output, [])
+        await self.update_treemap([])
+
+    async def drag_slider(self):
+        """Move the year slider over a few consecutive years."""
+        position = self.years.index(self.values['year-slider.value']) if self.values['year-slider.value'] in self.years else 0
+        target = self.rng.randrange(len(self.years))
+        step = 1 if target >= position else -1
+        for year in self.years[position + step:target + step:step]:
+            self.values['year-slider.value'] = year
+            await self.call(CHARTS, ['year-slider.value'])
+            await self.update_treemap(['year-slider.value'])
+        await self.think()
+
+    async def select(self, level):
+        """Select a random unit of a dropdown, sometimes by typing a part of its name first."""
+        options = [option for option in self.options.get(level, []) if option['value'] != 'ALL']
+        if not options:
+            return False
+        option = self.rng.choice(options)
+        if level >= 2 and self.rng.random() < 0.5:
+            words = str(option['label']).split()
+            self.values[f'level{level}-dropdown.search_value'] = words[0][:4] if words else ''
+            await self.call(SEARCH_LEVEL2 if level == 2 else SEARCH_LEVEL3, [f'level{level}-dropdown.search_value'])
+        self.values[f'level{level}-dropdown.value'] = option['value']
+        changed = [f'level{level}-dropdown.value']
+        await self.call(DROPDOWNS, changed)
+        await self.call(CHARTS, DROPDOWN_VALUES)
+        await self.think()
+        return True
+
+    async def cascade(self):
+        """Walk the dropdowns from a kraj down to an oddil."""
+        for level in range(4):
+            if not await self.select(level):
+                break
+
+    async def click_treemap(self):
+        if self.treemap_ids:
+            self.values['hierarchy-treemap.clickData'] = {'points': [{'id': self.rng.choice(self.treemap_ids)}]}
+            await self.update_treemap(['hierarchy-treemap.clickData'])
+            await self.think()
+
+    async def reset(self):
+        self.values['reset-button.n_clicks'] += 1
+        await self.call(RESET, ['reset-button.n_clicks'])
+        await self.call(DROPDOWNS, DROPDOWN_VALUES)
+        await self.call(CHARTS, DROPDOWN_VALUES)
+        await self.think()
+
+    async def visit(self):
+        """One visit of the dashboard."""
+        await self.page_load()
+        await self.think()
+        await self.drag_slider()
+        await self.cascade()
+        await self.drag_slider()
+        await self.click_treemap()
+        await self.reset()
+
+
+async def run_session(url, dependencies, layout, statistics, rng, think_time, start_delay, deadline):
+    await asyncio.sleep(start_delay)
+    parts = urlsplit(url)
+    connection = HttpConnection(parts.hostname, parts.port or 80)
+    try:
+        while time.monotonic() < deadline:
+            session = Session(connection, dependencies, layout, statistics, rng, think_time)
+            await session.visit()
+    finally:
+        await connection.close()
+
+
+async def run_load_test(url, sessions, duration, ramp_up=0, think_time=0.5, seed=0):
+    """
+    Run the simulated sessions against a running app.
+    Parameters:
+        url (str): Base URL of the app, e.g. 'http://127.0.0.1:8050'.
+        sessions (int): Number of concurrent sessions.
+        duration (float): Seconds after which no new visit is started.
+        ramp_up (float): The sessions start evenly spread over this many seconds.
+        think_time (float): Mean pause of a user between two actions, in seconds.
+        seed (int): Seed of the random choices.
+    Returns:
+        dict: Summary per callback function name and the total, see Statistics.report.
+    """
+    parts = urlsplit(url)
+    connection = HttpConnection(parts.hostname, parts.port or 80)
+    status, data = await connection.request('GET', '/_dash-dependencies')
+    dependencies = json.loads(data)
+    status, data = await connection.request('GET', '/_dash-layout')
+    layout = json.loads(data)
+    await connection.close()
+
+    statistics = Statistics()
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(*(
+        run_session(url, dependencies, layout, statistics, random.Random(seed + i), think_time,
+                    ramp_up * i / sessions, deadline)
+        for i in range(sessions)
+    ))
+    return statistics.report(time.monotonic() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay simulated dashboard sessions against a running app.")
+    parser.add_argument('--url', default='http://127.0.0.1:8050')
+    parser.add_argument('--sessions', type=int, default=10, help="Number of concurrent sessions.")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds during which new visits are started.")
+    parser.add_argument('--ramp-up', type=float, default=0, help="Seconds over which the sessions are started.")
+    parser.add_argument('--think-time', type=float, default=0.5, help="Mean pause between user actions in seconds, 0 for none.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON file for the results.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args.url, args.sessions, args.duration, args.ramp_up, args.think_time, args.seed))
+
+    print(f"{'callback':<26} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in report.items():
+        print(f"{name:<26} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput']:>8.2f} "
+              f"{stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'url': args.url, 'sessions': args.sessions, 'duration': args.duration,
+                       'think_time': args.think_time, 'results': report}, file, indent=2)
+        print(f"Results written to {args.output}.")
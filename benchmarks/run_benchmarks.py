@@ -0,0 +1,281 @@
+"""
+Headless benchmark suite of the data loading, the preprocessing and the dashboard callbacks.
+For every scale a synthetic dataset is generated (see generate_data.py), then every benchmark is run
+repeatedly and its timings are written to a JSON file. The callbacks are called through the Flask
+test client with the same requests the browser sends, with the figure cache disabled and the treemap
+built in the request instead of a background job, so the timings are the work of the callbacks.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scale 1 10 --output benchmarks/results.json
+    python benchmarks/run_benchmarks.py --scale 1 --baseline benchmarks/results.json --output new.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dash
+import numpy as np
+import pandas as pd
+import plotly
+from dash import Dash
+
+from dash_requests import find_dependency, update_request_body
+from generate_data import DEFAULT_YEARS, generate_dataset
+from src.DataLoader import DataLoader, ENCODING_CACHE_FILE
+from src.DataStore import DataStore
+from src.aggregates import AGE_GROUP_COLUMNS, UnitYearCube, consistency_report
+from src.callbacks import get_options, register_callbacks, search_options
+from src.figure_cache import FigureCache
+from src.layouts import create_layout
+from src.utils import add_hierarchy_levels, add_hierarchy_levels_text, add_hierarchy_levels_whole, compact_dataframe
+
+# Preprocessing of the dashboard, as in app.py
+TRANSFORMS = [add_hierarchy_levels, add_hierarchy_levels_text, compact_dataframe]
+# A benchmark slower than this factor of its baseline median is reported as a regression
+REGRESSION_FACTOR = 1.2
+
+
+def measure(function, repeat, setup=None):
+    """
+    Time a function.
+    Parameters:
+        function (callable): The measured code. Called with the result of setup, if given.
+        repeat (int): Number of timed calls.
+        setup (callable): Called before every call, outside of the timing.
+    Returns:
+        dict: min, median, mean and max duration in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        arguments = (setup(),) if setup else ()
+        # The code under test prints status messages, they are not part of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function(*arguments)
+            durations.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(durations),
+        'median': statistics.median(durations),
+        'mean': statistics.mean(durations),
+        'max': max(durations),
+    }
+
+
+class CallbackClient:
+    """Calls the registered callbacks of a Dash app through the Flask test client, like the browser does."""
+
+    def __init__(self, app):
+        self.client = app.server.test_client()
+        self.dependencies = self.client.get('/_dash-dependencies').get_json()
+
+    def call(self, output_prefix, values, changed):
+        """
+        Send one update request.
+        Parameters:
+            output_prefix (str): Start of the output key of the callback, e.g. 'hierarchy-treemap.figure'.
+            values (dict): 'component-id.property' -> value of the inputs and states.
+            changed (list): 'component-id.property' of the inputs that triggered the call.
+        """
+        body = update_request_body(find_dependency(self.dependencies, output_prefix), values, changed)
+        response = self.client.post('/_dash-update-component', json=body)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"{output_prefix} failed with status {response.status_code}")
+        return response
+
+
+def run_scale(scale, years, repeat, data_directory):
+    """Run all benchmarks on one generated dataset. Returns the list of results."""
+    results = []
+
+    def record(name, rows, timing):
+        result = {'benchmark': name, 'scale': scale, 'rows': rows, **timing}
+        results.append(result)
+        print(f"{scale:>6g}x  {name:<48} median {result['median'] * 1000:10.2f} ms")
+
+    source_directory = os.path.join(data_directory, 'sources')
+    if not os.path.isdir(source_directory) or not os.listdir(source_directory):
+        generate_dataset(source_directory, scale, years)
+
+    # Ingestion of the source CSVs
+    def ingest(workers=1):
+        loader = DataLoader(source_directory)
+        loader.load_all_csvs(workers=workers)
+        loader.normalize_and_merge()
+        return loader.get_merged_dataframe()
+
+    def remove_encoding_cache():
+        path = os.path.join(source_directory, ENCODING_CACHE_FILE)
+        if os.path.exists(path):
+            os.remove(path)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        merged = ingest()
+    rows = len(merged)
+    ingest_repeat = min(repeat, 3)
+    record('DataLoader.load_all_csvs (cold encoding cache)', rows,
+           measure(lambda _: ingest(), ingest_repeat, setup=remove_encoding_cache))
+    record('DataLoader.load_all_csvs', rows, measure(ingest, ingest_repeat))
+    record('DataLoader.load_all_csvs (one worker per CPU)', rows, measure(lambda: ingest(workers=None), ingest_repeat))
+
+    # Loading one merged file, with the preprocessing, with and without the snapshot
+    merged_path = os.path.join(data_directory, 'merged_dataframe.csv')
+    merged.to_csv(merged_path, index=False)
+
+    def load_merged(use_snapshot):
+        loader = DataLoader(data_directory)
+        loader.load_merged_dataframe(merged_path, transforms=TRANSFORMS, use_snapshot=use_snapshot)
+        return loader.get_merged_dataframe()
+
+    record('DataLoader.load_merged_dataframe (csv)', rows, measure(lambda: load_merged(False), ingest_repeat))
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_merged(True)  # Writes the snapshot
+    record('DataLoader.load_merged_dataframe (snapshot)', rows, measure(lambda: load_merged(True), ingest_repeat))
+
+    # Preprocessing
+    copy_merged = lambda: merged.copy()
+    record('add_hierarchy_levels', rows, measure(add_hierarchy_levels, repeat, setup=copy_merged))
+    record('add_hierarchy_levels_whole', rows, measure(add_hierarchy_levels_whole, repeat, setup=copy_merged))
+    hierarchy = add_hierarchy_levels(merged.copy())
+    record('add_hierarchy_levels_text', rows, measure(add_hierarchy_levels_text, repeat, setup=lambda: hierarchy))
+    dataset = add_hierarchy_levels_text(hierarchy)
+    record('compact_dataframe', rows, measure(compact_dataframe, repeat, setup=lambda: dataset.copy()))
+    with contextlib.redirect_stdout(io.StringIO()):
+        dataset = compact_dataframe(dataset)
+    record('DataStore', rows, measure(lambda: DataStore(dataset), repeat))
+    cube = UnitYearCube(dataset, ['RegularMembers'] + list(AGE_GROUP_COLUMNS.values()))
+    record('UnitYearCube.rolled_up', rows, measure(cube.rolled_up, repeat))
+    rolled_up = cube.rolled_up()
+    record('consistency_report', rows, measure(lambda: consistency_report(cube, rolled_up), repeat))
+
+    # Dropdown options, from the first unit of every level
+    store = DataStore(dataset)
+    kraj = store.options('kraj')[0][0]
+    okres = store.options('okres', {'kraj': kraj[:2]})[0][0]
+    stredisko = store.options('stredisko', {'okres': okres})[0][0]
+    oddil = store.options('oddil', {'stredisko': stredisko})[0][0]
+    record('get_options (okresy of a kraj)', rows,
+           measure(lambda: get_options(store, 'LevelOkres', {'LevelKraj': kraj[:2]}), repeat))
+    record('get_options (strediska of an okres)', rows,
+           measure(lambda: get_options(store, 'LevelStredisko', {'LevelKraj': kraj[:2], 'LevelOkres': okres}), repeat))
+    record('get_options (all oddily)', rows,
+           measure(lambda: get_options(store, 'LevelOddil', {'LevelKraj': 'AL'}), repeat))
+    record('search_options (all strediska)', rows,
+           measure(lambda: search_options(store, 'LevelStredisko', 'stred', {'LevelKraj': 'AL'}), repeat))
+
+    # Callbacks, every call builds its figures
+    app = Dash(__name__, assets_folder=os.path.join(ROOT, 'src', 'assets'))
+    app.layout = create_layout(dataset)
+    with contextlib.redirect_stdout(io.StringIO()):
+        register_callbacks(app, store, figure_cache=FigureCache(max_bytes=0), background_manager=False)
+    client = CallbackClient(app)
+    all_selected = {f'level{i}-dropdown.value': 'ALL' for i in range(4)}
+    oddil_selected = {'level0-dropdown.value': kraj, 'level1-dropdown.value': okres,
+                      'level2-dropdown.value': stredisko, 'level3-dropdown.value': oddil}
+    charts = 'line-chart.figure'
+    for label, selected in (('all regions', all_selected), ('oddil', oddil_selected)):
+        values = dict(selected, **{'year-slider.value': 2024})
+        record(f'update_charts ({label})', rows,
+               measure(lambda: client.call('..' + charts, values, ['level0-dropdown.value']), repeat))
+        record(f'update_charts (year slider, {label})', rows,
+               measure(lambda: client.call('..' + charts, values, ['year-slider.value']), repeat))
+    record('update_dropdowns (oddil selected)', rows,
+           measure(lambda: client.call('..level0-dropdown.value...level1-dropdown.options', oddil_selected,
+                                       ['level3-dropdown.value']), repeat))
+    record('search_level2_options', rows,
+           measure(lambda: client.call('level2-dropdown.options@', dict(all_selected, **{'level2-dropdown.search_value': 'stred'}),
+                                       ['level2-dropdown.search_value']), repeat))
+    record('search_level3_options', rows,
+           measure(lambda: client.call('level3-dropdown.options@', dict(all_selected, **{'level3-dropdown.search_value': 'oddil'}),
+                                       ['level3-dropdown.search_value']), repeat))
+
+    # Treemap nodes are memoized per year, every timed call uses another year so it is measured cold
+    treemap_years = iter(np.resize(store.series()[0], repeat).tolist())
+    record('generate_dynamic_treemap (year)', rows,
+           measure(lambda year: client.call('hierarchy-treemap.figure', {'treemap-request.data': {'year': year, 'focus': None}},
+                                            ['treemap-request.data']),
+                   repeat, setup=lambda: next(treemap_years)))
+    click = {'year': 2024, 'focus': f"all/{store.unit_name(kraj)}"}
+    record('generate_dynamic_treemap (click, cached nodes)', rows,
+           measure(lambda: client.call('hierarchy-treemap.figure', {'treemap-request.data': click}, ['treemap-request.data']), repeat))
+    record('select_treemap', rows,
+           measure(lambda: client.call('..treemap-request.data', {'year-slider.value': 2024}, ['year-slider.value']), repeat))
+    record('reset_dropdowns', rows,
+           measure(lambda: client.call('..level0-dropdown.value@', {'reset-button.n_clicks': 1}, ['reset-button.n_clicks']), repeat))
+    return results
+
+
+def environment():
+    """Versions of the measured code and of the libraries, stored with the results."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': {'pandas': pd.__version__, 'numpy': np.__version__, 'dash': dash.__version__, 'plotly': plotly.__version__},
+    }
+
+
+def compare(results, baseline_path):
+    """Print the change of every median against a previous results file, returns the number of regressions."""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {(r['benchmark'], r['scale']): r for r in json.load(file)['results']}
+    regressions = 0
+    print(f"\nCompared to {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result['benchmark'], result['scale']))
+        if previous is None:
+            continue
+        ratio = result['median'] / previous['median'] if previous['median'] else float('inf')
+        flag = 'REGRESSION' if ratio > REGRESSION_FACTOR else ''
+        regressions += bool(flag)
+        print(f"{result['scale']:>6g}x  {result['benchmark']:<48} {ratio:6.2f}x {flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the benchmark suite on generated data.")
+    parser.add_argument('--scale', type=float, nargs='+', default=[1, 10], help="Dataset scales to run (1, 10, 100, ...).")
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS, help="Number of generated years.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed calls per benchmark (at most 3 for the ingestion).")
+    parser.add_argument('--data-dir', help="Keep the generated data in this directory and reuse it in later runs.")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results.json'), help="JSON results file.")
+    parser.add_argument('--baseline', help="Previous results file to compare with.")
+    args = parser.parse_args()
+    all_results = []
+    for scale in args.scale:
+        if args.data_dir:
+            data_directory = os.path.join(args.data_dir, f"scale_{scale:g}_years_{args.years}")
+            os.makedirs(data_directory, exist_ok=True)
+            all_results += run_scale(scale, args.years, args.repeat, data_directory)
+        else:
+            data_directory = tempfile.mkdtemp(prefix='dashboard-benchmark-')
+            try:
+                all_results += run_scale(scale, args.years, args.repeat, data_directory)
+            finally:
+                shutil.rmtree(data_directory, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({**environment(), 'years': args.years, 'results': all_results}, file, indent=2)
+    print(f"Results written to {args.output}.")
+
+    if args.baseline and compare(all_results, args.baseline):
+        sys.exit(1)
@@ -0,0 +1,21 @@
+# gunicorn settings of the production server, start it from the repository root with
+#     gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:server'
+pythonpath = 'src'
+bind = os.environ.get('DASHBOARD_BIND', '0.0.0.0:8050')
+
+# Load the dataset in the master before forking, the workers share its read-only arrays copy-on-write
+preload_app = True
+# One worker per core, the callbacks are CPU bound
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Building the treemap of a year the first time can take a while on the full dataset
+timeout = 120
+
+
+def post_fork(server, worker):
+    # Optional background warm-up of the figure cache of the worker (DASHBOARD_WARM_UP=<threads>)
+    import wsgi
+    wsgi.start_warm_up()
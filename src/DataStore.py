@@ -0,0 +1,161 @@
+import types
+from functools import lru_cache
+
+from src.aggregates import AGE_GROUP_COLUMNS, UnitYearCube, consistency_report, treemap_nodes
+from src.hierarchy import HierarchyIndex
+from src.figure_cache import dataset_version
+
+# Treemap levels below the "all" root, from kraj down to the individual units
+TREEMAP_PATH = ['LevelKrajWhole', 'LevelOkresWhole', 'LevelStrediskoWhole', 'LevelOddilWhole', 'LevelDruzinaWhole']
+# Unit types that are not part of the kraj -> druzina tree and are left out of the treemap
+TREEMAP_EXCLUDED_TYPES = ['ustredi', 'zvlastniJednotka']
+
+
+class DataStore:
+    """
+    Read-only query interface over the loaded dataset, built once and shared by all callbacks.
+    The merged DataFrame is reduced to precomputed structures (yearly sums per unit and per subtree,
+    the hierarchy index and the treemap leaves), the store keeps no reference to it. The arrays of the
+    cubes are marked as not writeable. The query methods return new arrays (series, age_groups,
+    age_groups_batch) or the shared, not writeable treemap arrays, so a caller cannot change the data
+    of another request. The treemap leaves are only read by the store itself.
+    """
+
+    def __init__(self, df):
+        """
+        Parameters:
+            df (pd.DataFrame): The merged DataFrame after add_hierarchy_levels and add_hierarchy_levels_text.
+        """
+        # Content hash of the dataset, cached figures are only valid for this version
+        self.version = dataset_version(df)
+
+        # Yearly RegularMembers per unit for the line chart
+        self._members = UnitYearCube(df, ['RegularMembers'])
+        # Members per unit, year and age group for the bar chart
+        if all(column in df.columns for column in AGE_GROUP_COLUMNS.values()):
+            self._age_groups = UnitYearCube(df, AGE_GROUP_COLUMNS.values())
+        else:
+            self._age_groups = None
+        # The same sums over the subtree of every unit, for the rolled-up totals
+        self._members_rolled_up = self._members.rolled_up()
+        self._age_groups_rolled_up = self._age_groups.rolled_up() if self._age_groups is not None else None
+        # Parent -> children index for the cascading dropdowns
+        self._hierarchy = HierarchyIndex(df)
+
+        # Rows shown in the treemap, only the columns it needs
+        if 'UnitName' not in df.columns:
+            raise ValueError("Column 'UnitName' not found in the dataset")
+        self._treemap_leaves = df.loc[
+            df['RegularMembers'].notna()  # Drop NaN values
+            & (df['RegularMembers'] > 0)  # Drop zero values
+            & ~df['ID_UnitType'].isin(TREEMAP_EXCLUDED_TYPES),
+            ['Year', 'UnitName', 'RegularMembers'] + TREEMAP_PATH
+        ]
+        # Aggregated nodes are memoized per year, per store so they are dropped with it
+        self._treemap_nodes = lru_cache(maxsize=16)(self._build_treemap_nodes)
+
+        for cube in (self._members, self._age_groups, self._members_rolled_up, self._age_groups_rolled_up):
+            if cube is not None:
+                for array in (cube.years, cube.unit_names, cube.unit_types, cube.values, cube.present,
+                              cube.totals, cube.totals_present):
+                    array.setflags(write=False)
+
+    @property
+    def has_age_groups(self):
+        """Whether the dataset has the member count columns of all age groups."""
+        return self._age_groups is not None
+
+    @property
+    def age_group_labels(self):
+        return list(AGE_GROUP_COLUMNS.keys())
+
+    def unit_name(self, unit):
+        """Name of the unit as in its first row, or None if it is not in the data."""
+        return self._members.unit_name(unit)
+
+    def series(self, unit=None, rolled_up=False):
+        """
+        Yearly RegularMembers of one unit.
+        Parameters:
+            unit (str): Registration number of the unit. If None, the sums over all rows are returned.
+            rolled_up (bool): Sum the lowest units of the subtree instead of the reported totals,
+                see UnitYearCube.rolled_up().
+        Returns:
+            (years, members) arrays containing only the years in which the unit has data.
+        """
+        return (self._members_rolled_up if rolled_up else self._members).series(unit)
+
+    def age_groups(self, unit=None, year=None, rolled_up=False):
+        """
+        Members of one unit in one year per age group.
+        Parameters:
+            unit (str): Registration number of the unit. If None, the sums over all rows are returned.
+            year (int): The year.
+            rolled_up (bool): Sum the lowest units of the subtree instead of the reported totals.
+        Returns:
+            1D array in the order of age_group_labels, zeros when there is no data,
+            None if the dataset has no age group columns.
+        """
+        if self._age_groups is None:
+            return None
+        return (self._age_groups_rolled_up if rolled_up else self._age_groups).cell(unit, year)
+
+    def age_groups_batch(self, units, years, rolled_up=False):
+        """
+        Members per age group of many units and years in one call, e.g. for comparison views.
+        Parameters:
+            units (list): Registration numbers, None stands for the sums over all rows.
+            years (list): Years.
+            rolled_up (bool): Sum the lowest units of the subtree instead of the reported totals.
+        Returns:
+            Array of shape (len(units), len(years), len(age_group_labels)), zeros where a unit or year
+            has no data, None if the dataset has no age group columns.
+        """
+        if self._age_groups is None:
+            return None
+        return (self._age_groups_rolled_up if rolled_up else self._age_groups).batch(units, years)
+
+    def consistency_report(self, tolerance=0.0):
+        """
+        Units and years in which the lowest units report more RegularMembers than the unit itself, by
+        more than tolerance (a fraction of the reported value), see aggregates.consistency_report().
+        """
+        return consistency_report(self._members, self._members_rolled_up, tolerance)
+
+    def children(self, unit):
+        """
+        Direct children of a unit, e.g. the okresy of a kraj.
+        Returns:
+            list: (registration number, name) pairs, empty for unknown units and for druziny.
+        """
+        return self._hierarchy.children(unit)
+
+    def options(self, unit_type, parent_filters=None):
+        """Units of one type below the selected parents, see HierarchyIndex.options()."""
+        return self._hierarchy.options(unit_type, parent_filters)
+
+    def search(self, unit_type, query, parent_filters=None, limit=50):
+        """Units of one type matching a search text, see HierarchyIndex.search()."""
+        return self._hierarchy.search(unit_type, query, parent_filters, limit=limit)
+
+    def option_name(self, unit):
+        """Name shown for a unit in the dropdowns, or None if it is not one of the listed unit types."""
+        return self._hierarchy.names.get(unit)
+
+    def treemap(self, year):
+        """
+        All treemap nodes of one year, as returned by treemap_nodes.
+        Returns:
+            Read-only mapping of the column names to not writeable arrays, cached and shared by all
+            callers. pd.DataFrame(dict(nodes)) gives a table of one's own.
+        """
+        return self._treemap_nodes(year)
+
+    def _build_treemap_nodes(self, year):
+        leaves = self._treemap_leaves[self._treemap_leaves['Year'] == year]
+        nodes = treemap_nodes(leaves, TREEMAP_PATH, 'RegularMembers', 'UnitName', root="all")
+        columns = {}
+        for column in nodes.columns:
+            columns[column] = nodes[column].to_numpy(copy=True)
+            columns[column].setflags(write=False)
+        return types.MappingProxyType(columns)
@@ -0,0 +1,347 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Age group labels and the member count column each of them sums
+AGE_GROUP_COLUMNS = {
+    '0-6': 'MembersTo6',
+    '7-15': 'MembersTo15',
+    '16-18': 'MembersTo18',
+    '19-26': 'MembersTo26',
+    '27+': 'MembersFrom26',
+}
+
+
+class UnitYearCube:
+    """
+    Dense unit x year x column array of summed values, built once from the merged DataFrame.
+    Rows are registration numbers, the extra totals are sums over all rows (the "ALL regions" view).
+    A (unit, year) cell that has no row in the DataFrame is marked as not present, so lookups
+    return exactly the years a groupby('Year') over the unit's rows would.
+    """
+
+    def __init__(self, df, value_columns):
+        """
+        Parameters:
+            df (pd.DataFrame): The merged DataFrame with RegistrationNumber and Year columns.
+            value_columns (list): Columns to sum, in the order of the last axis.
+        """
+        self.value_columns = list(value_columns)
+
+        unit_codes, units = pd.factorize(df['RegistrationNumber'])
+        year_codes, years = pd.factorize(df['Year'], sort=True)
+        self.units = pd.Index(np.asarray(units, dtype=object))
+        self.years = np.asarray(years)
+
+        # Unit name and type of the first row of every registration number
+        _, first_rows = np.unique(unit_codes, return_index=True)
+        self.unit_names = df['UnitName'].to_numpy()[first_rows]
+        self.unit_types = df['ID_UnitType'].to_numpy()[first_rows]
+
+        values = df[self.value_columns].fillna(0).to_numpy()
+        # Sum in 64 bits, the columns may be downcast to small integer or float types
+        dtype = np.float64 if values.dtype.kind == 'f' else np.int64
+        shape = (len(self.units), len(self.years))
+        self.values = np.zeros(shape + (len(self.value_columns),), dtype=dtype)
+        np.add.at(self.values, (unit_codes, year_codes), values)
+        self.present = np.zeros(shape, dtype=bool)
+        self.present[unit_codes, year_codes] = True
+
+        self.totals = self.values.sum(axis=0)
+        self.totals_present = self.present.any(axis=0)
+
+    def rolled_up(self):
+        """
+        Cube of the same units and years with every value replaced by the sum over the lowest units of
+        the subtree of the unit. The reported totals of a parent already include its children, so a
+        subtree is summed over its leaves: a unit counts with its own row only in the years in which no
+        unit below it has a row. For a leaf the rolled-up value is its reported value, for a parent it is
+        what the units at the bottom of its subtree report. Members registered directly with a parent
+        (e.g. the leaders of an okres) are in no leaf, so a parent rolls up to at most its reported total.
+        The totals are the sums over all leaves.
+        """
+        order, starts, ends = subtree_ranges(self.units, self.unit_types)
+
+        # Rows in every subtree and year, from prefix sums over the units in registration number order
+        counts = np.zeros((len(order) + 1, len(self.years)), dtype=np.int64)
+        np.cumsum(self.present[order], axis=0, out=counts[1:])
+        is_leaf = self.present & (counts[ends] - counts[starts] == 1)
+
+        leaf_values = np.where(is_leaf[..., None], self.values, 0)
+        sums = np.zeros((len(order) + 1,) + self.values.shape[1:], dtype=self.values.dtype)
+        np.cumsum(leaf_values[order], axis=0, out=sums[1:])
+
+        cube = copy.copy(self)
+        cube.values = sums[ends] - sums[starts]
+        cube.totals = leaf_values.sum(axis=0)
+        return cube
+
+    def unit_index(self, registration_number):
+        """Row of a registration number, or -1 if it is not in the data."""
+        return self.units.get_indexer([registration_number])[0]
+
+    def year_index(self, year):
+        """Position of a year on the year axis, or -1 if there is no data for it."""
+        position = np.searchsorted(self.years, year)
+        return position if position < len(self.years) and self.years[position] == year else -1
+
+    def unit_name(self, registration_number):
+        """Name of the unit as in its first row, or None if it is not in the data."""
+        row = self.unit_index(registration_number)
+        return self.unit_names[row] if row >= 0 else None
+
+    def series(self, registration_number=None, column=None):
+        """
+        Yearly values of one unit.
+        Parameters:
+            registration_number (str): The unit. If None, the totals over all rows are returned.
+            column (str): Value column, defaults to the first one.
+        Returns:
+            (years, values) arrays containing only the years in which the unit has data.
+        """
+        column_index = self.value_columns.index(column) if column else 0
+        if registration_number is None:
+            values, present = self.totals[:, column_index], self.totals_present
+        else:
+            row = self.unit_index(registration_number)
+            if row < 0:
+                return self.years[:0], self.values[:0, 0, column_index]
+            values, present = self.values[row, :, column_index], self.present[row]
+        return self.years[present], values[present]
+
+    def cell(self, registration_number=None, year=None):
+        """
+        Values of all columns for one unit and year.
+        Parameters:
+            registration_number (str): The unit. If None, the totals over all rows are used.
+            year (int): The year.
+        Returns:
+            1D array in the order of value_columns, zeros when there is no data.
+        """
+        return self.batch([registration_number], [year])[0, 0]
+
+    def batch(self, registration_numbers, years):
+        """
+        Values of all columns for many units and years in one call.
+        Parameters:
+            registration_numbers (list): Units, None stands for the totals over all rows.
+            years (list): Years.
+        Returns:
+            Array of shape (len(registration_numbers), len(years), len(value_columns)),
+            zeros where a unit or year has no data.
+        """
+        # -2 marks the totals row, -1 an unknown unit or year
+        rows = np.full(len(registration_numbers), -2, dtype=int)
+        is_unit = np.array([number is not None for number in registration_numbers], dtype=bool)
+        if is_unit.any():
+            rows[is_unit] = self.units.get_indexer([number for number in registration_numbers if number is not None])
+        years = np.asarray(years)
+        if len(self.years):
+            columns = np.searchsorted(self.years, years).clip(max=len(self.years) - 1)
+            columns = np.where(self.years[columns] == years, columns, -1)
+        else:
+            columns = np.full(len(years), -1)
+        result = np.zeros((len(rows), len(columns), len(self.value_columns)), dtype=self.values.dtype)
+
+        known_years = columns >= 0
+        unit_rows = np.flatnonzero(rows >= 0)
+        result[np.ix_(unit_rows, known_years)] = self.values[np.ix_(rows[unit_rows], columns[known_years])]
+        total_rows = np.flatnonzero(rows == -2)
+        result[np.ix_(total_rows, known_years)] = self.totals[columns[known_years]][None]
+        return result
+
+
+def subtree_ranges(registration_numbers, unit_types):
+    """
+    Subtree of every unit as a range of the sorted registration numbers, e.g. '111.01' covers
+    '111.01', '111.01.001', '111.01.001-01', ... and kraj '110' covers every number starting with '11'.
+    Parameters:
+        registration_numbers (array-like): Registration numbers of the units.
+        unit_types (array-like): ID_UnitType of the units, in the same order.
+    Returns:
+        (order, starts, ends): order sorts the units by registration number, the subtree of unit i are
+        the units order[starts[i]:ends[i]] (the unit itself included).
+    """
+    numbers = np.asarray(registration_numbers, dtype=str)
+    unit_types = np.asarray(unit_types, dtype=object)
+    order = np.argsort(numbers, kind='stable')
+    sorted_numbers = numbers[order]
+
+    # A unit is followed by its children: '-' (druzina) and '.' (the other levels) sort right before '/'.
+    # A kraj is the parent of the okresy with the same first two digits, the ustredi of every unit.
+    lower = numbers.astype(object)
+    upper = lower + '/'
+    is_kraj = unit_types == 'kraj'
+    lower[is_kraj] = [number[:2] for number in numbers[is_kraj]]
+    upper[is_kraj] = lower[is_kraj] + '~'
+    is_ustredi = unit_types == 'ustredi'
+    lower[is_ustredi] = ''
+    upper[is_ustredi] = '~'
+    starts = np.searchsorted(sorted_numbers, lower.astype(str), side='left')
+    ends = np.searchsorted(sorted_numbers, upper.astype(str), side='left')
+    return order, starts, ends
+
+
+def consistency_report(reported, rolled_up, tolerance=0.0):
+    """
+    Units whose lowest units report more than the unit itself. The reported total of a parent also
+    counts the members registered directly with it, so only a rolled-up value above the reported one
+    contradicts the reports.
+    Parameters:
+        reported (UnitYearCube): Cube of the reported values.
+        rolled_up (UnitYearCube): The same cube after rolled_up().
+        tolerance (float): Excesses up to this fraction of the reported value are accepted.
+    Returns:
+        pd.DataFrame with RegistrationNumber, UnitName, ID_UnitType, Year, Reported, RolledUp and
+        Difference (RolledUp - Reported) of the first value column, the largest differences first.
+    """
+    reported_values = reported.values[..., 0]
+    difference = rolled_up.values[..., 0] - reported_values
+    units, years = np.nonzero(reported.present & (difference > tolerance * np.abs(reported_values)))
+    report = pd.DataFrame({
+        'RegistrationNumber': reported.units.to_numpy()[units],
+        'UnitName': reported.unit_names[units],
+        'ID_UnitType': reported.unit_types[units],
+        'Year': reported.years[years],
+        'Reported': reported_values[units, years],
+        'RolledUp': rolled_up.values[units, years, 0],
+        'Difference': difference[units, years],
+    })
+    return report.iloc[np.argsort(-report['Difference'].to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+def treemap_nodes(df, path, value_column, name_column, root='all'):
+    """
+    Aggregate rows into treemap nodes, the same way px.treemap(path=[px.Constant(root)] + path) does,
+    but summing only the value column instead of every column of the DataFrame.
+    Parameters:
+        df (pd.DataFrame): One row per leaf.
+        path (list): Columns from the top level down to the leaves.
+        value_column (str): Column summed into the node sizes.
+        name_column (str): Column shown for a node, '(?)' when the rows below it have different values.
+        root (str): Label of the root node.
+    Returns:
+        pd.DataFrame with ids, labels, parents, values, names and depth (0 for the root) columns, leaves first
+        and the root last (within a level sorted by label, then by the labels of the parents).
+    """
+    df = df.dropna(subset=path)
+    # Sum in 64 bits and show names as plain strings, the columns may be downcast or categorical
+    value_dtype = np.float64 if pd.api.types.is_float_dtype(df[value_column]) else np.int64
+    df = df.astype({value_column: value_dtype, name_column: object})
+    levels = []
+    for depth in range(len(path), -1, -1):
+        if depth == 0:
+            if df.empty:
+                break
+            names = df[name_column].unique()
+            levels.append(pd.DataFrame({
+                'ids': [root],
+                'labels': [root],
+                'parents': [''],
+                'values': [df[value_column].sum()],
+                'names': [names[0] if len(names) == 1 else '(?)'],
+                'depth': [0],
+            }))
+            break
+
+        # Group by the path up to this level, the deepest column first (this is the px ordering)
+        group_columns = path[:depth][::-1]
+        grouped = df.groupby(group_columns, sort=True, observed=True)
+        values = grouped[value_column].sum()
+        name_counts = grouped[name_column].nunique(dropna=False)
+        first_names = grouped[name_column].first()
+
+        labels = [values.index.get_level_values(i).astype(str) for i in range(depth)][::-1]
+        parents = pd.Series(root, index=values.index)
+        for label in labels[:-1]:
+            parents = parents + '/' + label
+        levels.append(pd.DataFrame({
+            'ids': (parents + '/' + labels[-1]).to_numpy(),
+            'labels': labels[-1].to_numpy(),
+            'parents': parents.to_numpy(),
+            'values': values.to_numpy(),
+            'names': first_names.where(name_counts == 1, '(?)').to_numpy(),
+            'depth': depth,
+        }))
+    if not levels:
+        return pd.DataFrame(columns=['ids', 'labels', 'parents', 'values', 'names', 'depth'])
+    return pd.concat(levels, ignore_index=True)
+
+
+def limit_treemap_nodes(nodes, focus_id=None, default_depth=3, expand_depth=2, node_budget=None):
+    """
+    Select the treemap nodes sent to the browser.
+    Parameters:
+        nodes (pd.DataFrame): All nodes, as returned by treemap_nodes.
+        focus_id (str): Id of the node the user clicked into. Its subtree is included down to
+            expand_depth levels below it.
+        default_depth (int): Nodes up to this depth are always included (3 = kraj, okres, stredisko).
+        expand_depth (int): Number of levels shown below the focused node.
+        node_budget (int): Maximum number of nodes. Above it, the smallest nodes without included
+            children are merged into one "other" node per parent. When merging cannot get under the
+            budget, the deepest level is dropped first (its nodes are still counted in their parents),
+            level by level up to the okresy. Only the focused node and its ancestors, which are always
+            kept, can leave the result above a very small budget.
+    Returns:
+        pd.DataFrame with the selected nodes, in the order of nodes.
+    """
+    selected = nodes['depth'] <= default_depth
+    focus = nodes[nodes['ids'] == focus_id]
+    if not focus.empty:
+        focus_depth = focus['depth'].iloc[0]
+        in_subtree = (nodes['ids'] == focus_id) | nodes['ids'].str.startswith(focus_id + '/')
+        selected |= in_subtree & (nodes['depth'] <= focus_depth + expand_depth)
+    nodes = nodes[selected]
+
+    if node_budget is None or len(nodes) <= node_budget:
+        return nodes
+
+    # Never merged or dropped: the focused node and its ancestors
+    protected = []
+    if focus_id:
+        parts = focus_id.split('/')
+        protected = ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+    while True:
+        merged = _smallest_leaves(nodes, protected, node_budget)
+        if len(nodes) - len(merged) + merged['parents'].nunique() <= node_budget:
+            break
+        droppable = ~nodes['ids'].isin(protected) & (nodes['depth'] >= 2)
+        if not droppable.any():
+            break
+        nodes = nodes[~(droppable & (nodes['depth'] == nodes.loc[droppable, 'depth'].max()))]
+        if len(nodes) <= node_budget:
+            return nodes
+    if merged.empty:
+        return nodes
+
+    others = merged.groupby('parents', sort=False).agg(values=('values', 'sum'), count=('values', 'size'), depth=('depth', 'first'))
+    others = pd.DataFrame({
+        'ids': others.index + '/other',
+        'labels': 'other',
+        'parents': others.index,
+        'values': others['values'].to_numpy(),
+        'names': others['count'].map(lambda count: f"{count} smaller units").to_numpy(),
+        'depth': others['depth'].to_numpy(),
+    })
+    return pd.concat([nodes.drop(merged.index), others], ignore_index=True)
+
+
+def _smallest_leaves(nodes, protected, node_budget):
+    """
+    The fewest smallest nodes without included children whose merge into one "other" node per parent gets
+    the nodes under node_budget, or all of them when that is not enough. A parent always keeps at least
+    two merged leaves, merging its only one would just rename it.
+    """
+    is_leaf = ~nodes['ids'].isin(nodes['parents']) & ~nodes['ids'].isin(protected)
+    leaves = nodes[is_leaf]
+    leaves = leaves[leaves['parents'].duplicated(keep=False)].sort_values('values', kind='stable')
+
+    # Merging the k smallest leaves removes k nodes and adds one "other" node per distinct parent
+    new_parents = (~leaves['parents'].duplicated()).cumsum().to_numpy()
+    merged_counts = np.arange(1, len(leaves) + 1)
+    fits = len(nodes) - merged_counts + new_parents <= node_budget
+    merged = leaves.iloc[:merged_counts[fits.argmax()] if fits.any() else len(leaves)]
+    # A parent with a single one of the k leaves keeps it, removing it and adding its "other" saves nothing
+    return merged[merged['parents'].duplicated(keep=False)]
@@ -1,31 +1,59 @@
-from dash import Dash
-from DataLoader import DataLoader
-from layouts import create_layout
-from callbacks import register_callbacks
-from utils import add_hierarchy_levels,add_hierarchy_levels_whole,add_hierarchy_levels_text
+import logging
+import os
+
+from startup_profiler import StartupProfiler
+
+# Time and memory of every startup phase, logged once the app is ready (DASHBOARD_STARTUP_REPORT also writes them to a JSON file)
+startup_profiler = StartupProfiler()
+
+with startup_profiler.phase('imports'):
+    from dash import Dash
+    from DataLoader import DataLoader
+    from DataStore import DataStore
+    from layouts import create_layout
+    from callbacks import register_callbacks
+    from utils import add_hierarchy_levels,add_hierarchy_levels_whole,add_hierarchy_levels_text,compact_dataframe
+
+# Log level of the dashboard, DEBUG also logs every callback call (DASHBOARD_LOG_LEVEL=WARNING switches the logs off)
+logging.basicConfig(level=os.environ.get('DASHBOARD_LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+# Post-processing of the loaded data, every transform is reported as its own phase (they do not run
+# when the result is cached in the snapshot)
+transforms = [startup_profiler.wrap(transform) for transform in (add_hierarchy_levels, add_hierarchy_levels_text, compact_dataframe)]
 
 # Initialize DataLoader
 data_directory = '../data'
 data_loader = DataLoader(data_directory)
-if(True):
-    # use one already merged file
-    data_loader.load_merged_dataframe('./src/merged_dataframe.csv')
-else:
-    # load a new csv or play with encoding
-    dataframes = data_loader.load_all_csvs()  # Load datasets
-    data_loader.normalize_and_merge()
+with startup_profiler.phase('DataLoader load'):
+    if(True):
+        # use one already merged file, hierarchy columns are cached in the snapshot next to it
+        # (DASHBOARD_DATA selects another merged file, e.g. one written by benchmarks/generate_data.py)
+        data_loader.load_merged_dataframe(os.environ.get('DASHBOARD_DATA', './src/merged_dataframe.csv'),
+                                          transforms=transforms)
+    else:
+        # load the source csvs through the partitioned store, only new or changed files are parsed
+        data_loader.load_merged_store(transforms=transforms)  # sequential, see load_all_csvs
+        #merged_dataframe = add_hierarchy_levels_whole(merged_dataframe) #needed for treemap
 
 merged_dataframe = data_loader.get_merged_dataframe()
-merged_dataframe = add_hierarchy_levels(merged_dataframe)
-#merged_dataframe = add_hierarchy_levels_whole(merged_dataframe) #needed for treemap
-
-
-merged_dataframe = add_hierarchy_levels_text(merged_dataframe) #needed for treemap
+# Read-only query structures shared by all callbacks
+with startup_profiler.phase('DataStore'):
+    data_store = DataStore(merged_dataframe)
 
 # Initialize Dash app
 app = Dash(__name__, assets_folder='assets')
-app.layout = create_layout(merged_dataframe)  # Pass dataset names to the layout
+with startup_profiler.phase('create_layout'):
+    app.layout = create_layout(merged_dataframe)  # Pass dataset names to the layout
 
 if __name__ == '__main__':
-    register_callbacks(app, merged_dataframe)
-    app.run_server(debug=True)
+    with startup_profiler.phase('register_callbacks'):
+        warm_up = register_callbacks(app, data_store)
+    startup_profiler.report(os.environ.get('DASHBOARD_STARTUP_REPORT'))
+    debug = True
+    # DASHBOARD_WARM_UP=<threads> prebuilds the figures of every year and kraj in the background. With
+    # debug the reloader runs the app in a child process (WERKZEUG_RUN_MAIN), its parent only watches the files
+    warm_up_workers = int(os.environ.get('DASHBOARD_WARM_UP', 0))
+    if warm_up_workers and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        warm_up.start(warm_up_workers)
+    app.run_server(debug=debug)
@@ -1,12 +1,26 @@
-from dash import no_update
-from dash.dependencies import Input, Output
-import plotly.express as px
+import logging
+import os
+import tempfile
+from functools import partial
+
+from dash import no_update, DiskcacheManager, Patch
+from flask import Response, jsonify, request
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
 from dash import callback_context
 
 from src.utils import add_hierarchy_levels_whole
+from src.aggregates import limit_treemap_nodes
+from src.figure_cache import FigureCache
+from src.DataStore import DataStore
+from src.instrumentation import CallbackMetrics, phase
+from src.warm_up import FigureWarmUp
+
+logger = logging.getLogger(__name__)
 
 pestra_palette = [
     "#FFCC00", "#EE8027", "#E53434", "#A0067D", "#5E2281",
@@ -18,53 +32,130 @@ logo_palette = [
     "#336CAA", "#3979B5"
 ]
 
-def register_callbacks(app, merged_dataframe):
-    # Line chart callback
-    @app.callback(
-        Output('line-chart', 'figure'),
+# Map current levels to their corresponding ID_UnitType
+LEVEL_TO_UNIT_TYPE = {
+    'LevelOddil': 'oddil',
+    'LevelStredisko': 'stredisko',
+    'LevelOkres': 'okres'
+}
+# Map parent filter columns to the parent keys of the hierarchy index
+PARENT_LEVEL_TO_UNIT_TYPE = {
+    'LevelKraj': 'kraj',
+    'LevelOkres': 'okres',
+    'LevelStredisko': 'stredisko'
+}
+# Treemap levels sent by default (3 = down to stredisko) and levels expanded below a clicked node
+TREEMAP_DEFAULT_DEPTH = 3
+TREEMAP_EXPAND_DEPTH = 2
+# Maximum number of treemap nodes sent to the browser, smaller ones are merged into "other"
+TREEMAP_NODE_BUDGET = 2000
+# Position of the selected-year marker among the line chart traces (line, data points, highlight),
+# the year slider patches this trace (tests/test_chart_callbacks.py compares it with a full build)
+HIGHLIGHT_TRACE = 2
+# Maximum number of options returned for a dropdown search
+SEARCH_RESULTS_LIMIT = 50
+# Disk cache of the background callback jobs and results, shared by all worker processes
+BACKGROUND_CACHE_DIRECTORY = os.path.join(tempfile.gettempdir(), 'dashboard-background-callbacks')
+# Results of background callbacks not requested for this many seconds are removed
+BACKGROUND_RESULT_EXPIRE = 24 * 3600
+# How often the browser asks for the result of a running treemap job, in milliseconds
+TREEMAP_POLL_INTERVAL = 250
+
+def register_callbacks(app, data_store, treemap_node_budget=TREEMAP_NODE_BUDGET, figure_cache=None, metrics=None,
+                       background_manager=None):
+    """
+    Register the callbacks of the dashboard on a Dash app.
+    Parameters:
+        background_manager: Job manager of the treemap background callback, by default a BackgroundJobManager
+            (see create_background_manager). False builds the treemap in the request instead.
+    Returns:
+        FigureWarmUp: Not started warm-up of the charts of every year and kraj and of the treemap of every
+            year, call its start() to fill the figure cache in the background.
+    """
+    # The callbacks only read the precomputed, read-only store, a loaded DataFrame is wrapped once here
+    if isinstance(data_store, pd.DataFrame):
+        data_store = DataStore(data_store)
+
+    # Figures are pure functions of the (normalized) inputs, the cache is cleared when the dataset changes
+    if figure_cache is None:
+        figure_cache = FigureCache()
+    figure_cache.set_dataset(data_store.version)
+
+    @app.server.route('/figure-cache')
+    def figure_cache_stats():
+        return jsonify(figure_cache.stats())
+
+    # Units whose lowest units report more than the unit itself, ?tolerance=0.05 accepts 5% more
+    @app.server.route('/consistency-report')
+    def consistency_report():
+        report = data_store.consistency_report(request.args.get('tolerance', 0.0, type=float))
+        return Response(report.to_csv(index=False), mimetype='text/csv')
+
+    # Every callback is registered through the instrumentation: per-phase timings in a Server-Timing
+    # header of its responses and in /metrics
+    if metrics is None:
+        metrics = CallbackMetrics()
+    metrics.install(app)
+    callback = metrics.callback(app)
+
+    # Line and bar chart callback, both figures share one resolution of the selected unit
+    @callback(
+        [Output('line-chart', 'figure'),
+         Output('age-group-bar-chart', 'figure')],
         [Input('year-slider', 'value'),
          Input('level0-dropdown', 'value'),
          Input('level1-dropdown', 'value'),
          Input('level2-dropdown', 'value'),
-         Input('level3-dropdown', 'value')])
-    def update_line_chart(selected_year, level0_value, level1_value, level2_value, level3_value):
-        # Start with the full dataset
-        df = merged_dataframe.copy()
-
-        # Debug print
-        #print(f"Selected year: {selected_year}")
-        print(f"Line chart      : level0: {level0_value}, Level1: {level1_value}, Level2: {level2_value}, Level3: {level3_value}")
-
-        # Determine the most specific level to use
-        selected_level = None
-        selected_value = None
-
-        if level3_value != 'ALL':
-            selected_level = 'oddil'
-            selected_value = level3_value
-        elif level2_value != 'ALL':
-            selected_level = 'stredisko'
-            selected_value = level2_value
-        elif level1_value != 'ALL':
-            selected_level = 'okres'
-            selected_value = level1_value
-        elif level0_value != 'ALL':
-            selected_level = 'kraj'
-            selected_value = level0_value
-
-        # Filter the dataset if a specific level is selected
-        if selected_value:
-            df = df[df['RegistrationNumber'] == selected_value]
-
-        # Retrieve the UnitName for the title
-        unit_name = None
-        if selected_value:
-            unit_row = df[df['RegistrationNumber'] == selected_value]
-            if not unit_row.empty:
-                unit_name = unit_row['UnitName'].iloc[0]
-
-        # Aggregate RegularMembers by year
-        df_grouped = df.groupby('Year', as_index=False)['RegularMembers'].sum()
+         Input('level3-dropdown', 'value'),
+         Input('totals-mode', 'value')])
+    def update_charts(selected_year, level0_value, level1_value, level2_value, level3_value, totals_mode=None):
+        logger.debug("Line/bar chart: level0: %s, level1: %s, level2: %s, level3: %s",
+                     level0_value, level1_value, level2_value, level3_value)
+
+        # Determine the most specific level to use and retrieve its UnitName for the titles
+        with phase('query'):
+            selected_level, selected_value = resolve_selection(level0_value, level1_value, level2_value, level3_value)
+            unit_name = data_store.unit_name(selected_value) if selected_value else None
+        # Reported totals of the selected unit, or the sums over the units below it
+        rolled_up = totals_mode == 'rolled-up'
+
+        # When only the year moved, the line itself is unchanged: just move the highlighted point
+        ctx = callback_context
+        if [trigger['prop_id'] for trigger in ctx.triggered] == ['year-slider.value']:
+            line_chart = Patch()
+            line_chart['data'][HIGHLIGHT_TRACE]['x'], line_chart['data'][HIGHLIGHT_TRACE]['y'] = \
+                get_highlight_point(selected_value, selected_year, rolled_up)
+        else:
+            line_chart = get_line_chart(selected_year, level0_value, selected_value, unit_name, rolled_up)
+        bar_chart = get_bar_chart(selected_year, level0_value, selected_value, unit_name, rolled_up)
+        return line_chart, bar_chart
+
+    def get_line_chart(selected_year, level0_value, selected_value, unit_name, rolled_up=False):
+        return figure_cache.get_or_build(
+            ('line-chart', selected_year, level0_value, selected_value, rolled_up),
+            lambda: build_line_chart(selected_year, level0_value, selected_value, unit_name, rolled_up)
+        )
+
+    def get_bar_chart(selected_year, level0_value, selected_value, unit_name, rolled_up=False):
+        return figure_cache.get_or_build(
+            ('age-group-bar-chart', selected_year, level0_value, selected_value, rolled_up),
+            lambda: build_bar_chart(selected_year, level0_value, selected_value, unit_name, rolled_up)
+        )
+
+    def get_highlight_point(selected_value, selected_year, rolled_up=False):
+        """x and y of the highlighted point of the line chart, empty lists if the year has no data."""
+        with phase('query'):
+            years, members = data_store.series(selected_value or None, rolled_up=rolled_up)
+        matches = np.flatnonzero(years == selected_year)
+        if len(matches) == 0:
+            return [], []
+        return [selected_year], [members[matches[0]]]
+
+    def build_line_chart(selected_year, level0_value, selected_value, unit_name, rolled_up=False):
+        # Look up the yearly RegularMembers of the selected unit (or of all rows) in the store
+        with phase('query'):
+            years, members = data_store.series(selected_value or None, rolled_up=rolled_up)
+        df_grouped = pd.DataFrame({'Year': years, 'RegularMembers': members})
 
         # Determine the dynamic title
         if level0_value == 'ALL' or not level0_value:
@@ -73,7 +164,8 @@ def register_callbacks(app, merged_dataframe):
             title = f"Regular Members Over Time ({unit_name})" if unit_name else f"Regular Members Over Time ({level0_value})"
 
 
-        # Create the line chart
+        # Create the line chart (plotly.express is imported on the first build, it is slow to import)
+        import plotly.express as px
         fig = px.line(
             df_grouped,
             x='Year',
@@ -91,15 +183,15 @@ def register_callbacks(app, merged_dataframe):
             name="Data Points"
         )
 
-        # Highlight the selected year
-        if selected_year in df_grouped['Year'].values:
-            selected_year_value = df_grouped[df_grouped['Year'] == selected_year]['RegularMembers'].iloc[0]
-            fig.add_scatter(
-                x=[selected_year],
-                y=[selected_year_value],
-                mode='markers',
-                marker=dict(size=14, color='#F49E00', symbol='circle')
-            )
+        # Highlight the selected year, the trace is always present (empty if the year has no data)
+        # so that a change of the year only has to patch its x and y
+        highlight_x, highlight_y = get_highlight_point(selected_value, selected_year, rolled_up)
+        fig.add_scatter(
+            x=highlight_x,
+            y=highlight_y,
+            mode='markers',
+            marker=dict(size=14, color='#F49E00', symbol='circle')
+        )
         y_max = df_grouped['RegularMembers'].max() * 1.2 if not df_grouped.empty else 10  # Add 10% padding or use a default
 
 
@@ -109,86 +201,34 @@ def register_callbacks(app, merged_dataframe):
         fig.update_traces(line=dict(color='#3979B5', width=3))
         fig.update_layout(
             xaxis=dict(dtick=1),
-            yaxis=dict(title="# regular members",range=[0, y_max]),
+            yaxis=dict(title=members_axis_title(rolled_up),range=[0, y_max]),
             title_x=0.5,
             showlegend=False,
         )
 
 
         return fig
-    # Bar chart for age groups callback
-    @app.callback(
-        Output('age-group-bar-chart', 'figure'),
-        [
-            Input('year-slider', 'value'),
-            Input('level0-dropdown', 'value'),
-            Input('level1-dropdown', 'value'),
-            Input('level2-dropdown', 'value'),
-            Input('level3-dropdown', 'value'),
-        ]
-    )
-    def update_bar_chart(selected_year, level0_value, level1_value, level2_value, level3_value):
-        # Start with the full dataset
-        print(f"Bar chart       : level0: {level0_value}, Level1: {level1_value}, Level2: {level2_value}, Level3: {level3_value}")
-
-        df = merged_dataframe.copy()
-
-        # Determine the most specific level to use
-        selected_level = None
-        selected_value = None
-
-        if level3_value != 'ALL':
-            selected_level = 'oddil'
-            selected_value = level3_value
-        elif level2_value != 'ALL':
-            selected_level = 'stredisko'
-            selected_value = level2_value
-        elif level1_value != 'ALL':
-            selected_level = 'okres'
-            selected_value = level1_value
-        elif level0_value != 'ALL':
-            selected_level = 'kraj'
-            level0_value_short = level0_value[:2]
-            selected_value = level0_value
-
-
-        # Filter the dataset if a specific level is selected
-        if selected_value:
-            df = df[df['RegistrationNumber'] == selected_value]
-
-        # Further filter by the selected year
-        df = df[df['Year'] == selected_year]
 
+    def build_bar_chart(selected_year, level0_value, selected_value, unit_name, rolled_up=False):
         # Ensure required columns are present
-        required_columns = ['MembersTo6', 'MembersTo15', 'MembersTo18', 'MembersTo26', 'MembersFrom26']
-        if not all(col in df.columns for col in required_columns):
+        import plotly.express as px
+        if not data_store.has_age_groups:
             return px.bar(title="Dataset does not have required columns for age groups.")
 
-        # Aggregate data for age groups
-        age_groups = {
-            '0-6': df['MembersTo6'].sum(),
-            '7-15': df['MembersTo15'].sum(),
-            '16-18': df['MembersTo18'].sum(),
-            '19-26': df['MembersTo26'].sum(),
-            '27+': df['MembersFrom26'].sum()
-        }
-
-        # Create a DataFrame for plotting
-        age_group_df = pd.DataFrame({'AgeGroup': age_groups.keys(), 'Members': age_groups.values()})
-
-        # Retrieve the UnitName for the title
-        unit_name = None
-        if selected_value:
-            unit_row = merged_dataframe[merged_dataframe['RegistrationNumber'] == selected_value]
-            if not unit_row.empty:
-                unit_name = unit_row['UnitName'].iloc[0]
+        # Read the age groups of the selected unit (or of all rows) in the selected year from the store
+        with phase('query'):
+            members = data_store.age_groups(selected_value or None, selected_year, rolled_up=rolled_up)
+        age_group_df = pd.DataFrame({
+            'AgeGroup': data_store.age_group_labels,
+            'Members': members,
+        })
 
         # Determine the dynamic title
         if level0_value == 'ALL' or not level0_value:
             title = f"Age Group Distribution in {selected_year} (All Regions)"
         else:
             title = f"Age Group Distribution in {selected_year} ({unit_name})" if unit_name else f"Age Group Distribution in {selected_year} ({level0_value})"
-        print(title)
+        logger.debug("Bar chart: %s", title)
 
         # Create the bar chart
         fig = px.bar(
@@ -205,7 +245,7 @@ def register_callbacks(app, merged_dataframe):
         # Update layout and formatting
         fig.update_layout(
             xaxis_title="Age group",
-            yaxis_title="# regular members",
+            yaxis_title=members_axis_title(rolled_up),
             title_x=0.5,
             showlegend=False,  # Disable the legend
             bargap=0.1,  # Adjust space between bars (set closer to 0 to make bars wider)
@@ -227,7 +267,7 @@ def register_callbacks(app, merged_dataframe):
         return fig
 
 
-    @app.callback(
+    @callback(
         [
             Output('level0-dropdown', 'value'),
             Output('level1-dropdown', 'options'),
@@ -252,7 +292,7 @@ def register_callbacks(app, merged_dataframe):
         else:
             most_recently_clicked = ctx.triggered[0]['prop_id'].split('.')[0]
 
-        print(f"Most recently clicked dropdown: {most_recently_clicked}")
+        logger.debug("Most recently clicked dropdown: %s", most_recently_clicked)
 
         # Adjust higher levels based on the selected lower level
         if most_recently_clicked == 'level0-dropdown':
@@ -276,58 +316,133 @@ def register_callbacks(app, merged_dataframe):
                 level0_value = get_kraj_for_okres( level1_value)
 
         level0_value_short = level0_value[:2]  # Ensure the top-level value is shortened to match
-        print(f"Update dropdowns BEGINNING: level0: {level0_value}, Level1: {level1_value}, Level2: {level2_value}, Level3: {level3_value}")
+        logger.debug("Update dropdowns BEGINNING: level0: %s, level1: %s, level2: %s, level3: %s",
+                     level0_value, level1_value, level2_value, level3_value)
 
         # Filters dictionary for cascading filtering
         filters = {'LevelKraj': level0_value_short, 'LevelOkres': level1_value, 'LevelStredisko': level2_value}
 
-        # Update Level 1 (Okres) options based on LevelKraj
-        level1_options = get_options(merged_dataframe, current_level='LevelOkres', parent_filters={'LevelKraj': level0_value_short})
-        level2_options = get_options(merged_dataframe, current_level='LevelStredisko', parent_filters={'LevelKraj': level0_value_short, 'LevelOkres': level1_value})
-        level3_options = get_options(merged_dataframe, current_level='LevelOddil', parent_filters=filters)
+        with phase('query'):
+            # Update Level 1 (Okres) options based on LevelKraj
+            level1_options = get_options(data_store, current_level='LevelOkres', parent_filters={'LevelKraj': level0_value_short})
+            # Level 2 and 3 only list the units below a selected parent, the rest is found by searching
+            level2_options = get_options(data_store, current_level='LevelStredisko', parent_filters={'LevelKraj': level0_value_short, 'LevelOkres': level1_value}, require_parent=True)
+            level3_options = get_options(data_store, current_level='LevelOddil', parent_filters=filters, require_parent=True)
 
 
-        print(f"Update dropdowns END: level0: {level0_value}, Level1: {level1_value}, Level2: {level2_value}, Level3: {level3_value}")
+        logger.debug("Update dropdowns END: level0: %s, level1: %s, level2: %s, level3: %s",
+                     level0_value, level1_value, level2_value, level3_value)
 
         return level0_value, level1_options, level2_options, level3_options, level1_value, level2_value, level3_value
 
-    @app.callback(
-        Output('hierarchy-treemap', 'figure'),
+    # Searchable dropdowns: options are filled on demand from the name index
+    @callback(
+        Output('level2-dropdown', 'options', allow_duplicate=True),
+        [Input('level2-dropdown', 'search_value')],
+        [State('level0-dropdown', 'value'),
+         State('level1-dropdown', 'value'),
+         State('level2-dropdown', 'value')],
+        prevent_initial_call=True
+    )
+    def search_level2_options(search_value, level0_value, level1_value, level2_value):
+        if not search_value:
+            raise PreventUpdate
+        parent_filters = {'LevelKraj': level0_value[:2], 'LevelOkres': level1_value}
+        with phase('query'):
+            return search_options(data_store, 'LevelStredisko', search_value, parent_filters, level2_value)
+
+    @callback(
+        Output('level3-dropdown', 'options', allow_duplicate=True),
+        [Input('level3-dropdown', 'search_value')],
+        [State('level0-dropdown', 'value'),
+         State('level1-dropdown', 'value'),
+         State('level2-dropdown', 'value'),
+         State('level3-dropdown', 'value')],
+        prevent_initial_call=True
+    )
+    def search_level3_options(search_value, level0_value, level1_value, level2_value, level3_value):
+        if not search_value:
+            raise PreventUpdate
+        parent_filters = {'LevelKraj': level0_value[:2], 'LevelOkres': level1_value, 'LevelStredisko': level2_value}
+        with phase('query'):
+            return search_options(data_store, 'LevelOddil', search_value, parent_filters, level3_value)
+
+    @callback(
+        [Output('treemap-request', 'data'),
+         Output('hierarchy-treemap', 'figure', allow_duplicate=True)],
         [Input('loading-hierarchy-treemap', 'children'),  # Placeholder trigger
-        Input('year-slider', 'value')]
+        Input('year-slider', 'value'),
+        Input('hierarchy-treemap', 'clickData')],
+        prevent_initial_call='initial_duplicate'
     )
-    def generate_dynamic_treemap(_,selected_year):
+    def select_treemap(_,selected_year, click_data):
         """
-        Create a static hierarchy treemap from the DataFrame with renamed hierarchy levels.
+        Decide which treemap to show. A figure in the cache of this worker (e.g. from the warm-up) is sent
+        right away, any other is requested from generate_dynamic_treemap.
         """
-        df = merged_dataframe.copy()
-
-        hierarchy_levels = [px.Constant("all"),'LevelKrajWhole', 'LevelOkresWhole', 'LevelStrediskoWhole', 'LevelOddilWhole', 'LevelDruzinaWhole']
-        value_column = "RegularMembers"
-
-        df = df.dropna(subset=['RegularMembers'])  # Drop NaN values
-        df = df[df['RegularMembers'] > 0]  # Drop zero values
-        #print(merged_dataframe.to_string())
-        #print(merged_dataframe['UnitName'])
-        df = df[df['Year'] == selected_year]
-        df = df[~df['ID_UnitType'].isin(['ustredi', 'zvlastniJednotka'])]
+        # A new year starts again from the overview, a click expands the clicked node
+        ctx = callback_context
+        triggered = ctx.triggered[0]['prop_id'] if ctx.triggered else None
+        focus_id = None
+        if triggered == 'hierarchy-treemap.clickData' and click_data and click_data.get('points'):
+            focus_id = click_data['points'][0].get('id')
+        with phase('query'):
+            figure = figure_cache.get(('hierarchy-treemap', selected_year, focus_id))
+        if figure is not None:
+            return no_update, figure
+        return {'year': selected_year, 'focus': focus_id}, no_update
+
+    # A treemap that is not cached is built in a background job, so a slow year does not hold the worker
+    # that serves the charts. The job builds into the figure cache of its forked process, which is gone
+    # with it. A new request replaces the pending job, moving the slider or clicking cancels it right away.
+    background = {}
+    if background_manager is None:
+        background_manager = create_background_manager(data_store.version)
+    if background_manager:
+        background = dict(background=True, manager=background_manager, interval=TREEMAP_POLL_INTERVAL,
+                          cancel=[Input('year-slider', 'value'), Input('hierarchy-treemap', 'clickData')])
+        if hasattr(background_manager, 'handle'):
+            metrics.track_jobs(background_manager.handle)
+
+    @callback(
+        Output('hierarchy-treemap', 'figure'),
+        Input('treemap-request', 'data'),
+        prevent_initial_call=True,
+        **background
+    )
+    def generate_dynamic_treemap(treemap_request):
+        """
+        Create a hierarchy treemap down to the stredisko level, with the subtree of the clicked node expanded.
+        """
+        return get_treemap(treemap_request['year'], treemap_request['focus'])
 
-        if 'UnitName' not in df.columns:
-            raise ValueError("Column 'UnitName' not found in the dataset")
-        # Define the color palette with 14 colors
-        # Define the color palette with 14 colors
+    def get_treemap(selected_year, focus_id=None):
+        return figure_cache.get_or_build(
+            ('hierarchy-treemap', selected_year, focus_id),
+            lambda: build_treemap_figure(selected_year, focus_id)
+        )
 
+    def build_treemap_figure(selected_year, focus_id=None):
+        """
+        Build the treemap of one year with only the nodes that are shown.
+        """
+        with phase('query'):
+            nodes = limit_treemap_nodes(pd.DataFrame(dict(data_store.treemap(selected_year))), focus_id,
+                                        default_depth=TREEMAP_DEFAULT_DEPTH, expand_depth=TREEMAP_EXPAND_DEPTH,
+                                        node_budget=treemap_node_budget)
 
         # Create the treemap
-        fig = px.treemap(
-            df,
-            path=hierarchy_levels,  # Hierarchy levels
-            values=value_column,    # Size of nodes
-            title="Hierarchical Treemap in " + str(selected_year),
-            labels=df['UnitName'],  # Custom
-            custom_data=[df['UnitName']],  # Custom
-            color_discrete_sequence=pestra_palette  # Apply the custom color palette
-        )
+        fig = go.Figure(go.Treemap(
+            ids=nodes['ids'],
+            labels=nodes['labels'],
+            parents=nodes['parents'],
+            values=nodes['values'],
+            customdata=nodes[['names']],  # Custom
+            branchvalues='total',
+            domain=dict(x=[0.0, 1.0], y=[0.0, 1.0]),
+            name='',
+            level=focus_id if (nodes['ids'] == focus_id).any() else None,  # Keep the clicked node zoomed in
+        ))
 
         # Customize hover template and texttemplate
         fig.update_traces(
@@ -339,13 +454,16 @@ def register_callbacks(app, merged_dataframe):
 
         )
         fig.update_layout(
+            title="Hierarchical Treemap in " + str(selected_year),
+            treemapcolorway=pestra_palette,  # Apply the custom color palette
+            legend=dict(tracegroupgap=0),
             margin=dict(t=60,l=10, r=10, b=10)  # Reduce top, left, right, and bottom margins
         )
 
 
         return fig
 
-    @app.callback(
+    @callback(
         [
             Output('level0-dropdown', 'value',allow_duplicate=True),
             Output('level1-dropdown', 'value',allow_duplicate=True),
@@ -362,51 +480,129 @@ def register_callbacks(app, merged_dataframe):
         # Initial values
         return no_update
 
+    # Warm-up: the figures shown without any click (every year, all regions and every kraj, treemap
+    # overview), newest year first. The keys are the same as those of the callbacks above.
+    years, _ = data_store.series()
+    selections = [('ALL', None, None)] + [
+        (kraj, kraj, data_store.unit_name(kraj)) for kraj, _ in data_store.options('kraj')
+    ]
+    tasks = []
+    for year in sorted((int(year) for year in years), reverse=True):
+        tasks.append((f"treemap {year}", partial(get_treemap, year)))
+        for level0_value, selected_value, unit_name in selections:
+            tasks.append((f"line chart {year} {level0_value}", partial(get_line_chart, year, level0_value, selected_value, unit_name)))
+            tasks.append((f"bar chart {year} {level0_value}", partial(get_bar_chart, year, level0_value, selected_value, unit_name)))
+    warm_up = FigureWarmUp(tasks)
 
-    # Assuming `merged_dataframe` contains hierarchical data
-def get_options(dataframe, current_level, parent_filters):
+    @app.server.route('/warm-up')
+    def warm_up_progress():
+        return jsonify(warm_up.progress())
+
+    return warm_up
+
+
+def create_background_manager(dataset_version, directory=BACKGROUND_CACHE_DIRECTORY):
+    """
+    Job manager of the background callbacks: every job runs in a forked process and stores its result in
+    a disk cache, no separate broker is needed. Results are reused for the same inputs and dataset.
+    Returns:
+        BackgroundJobManager, or None if its optional dependencies (dash[diskcache]) are not installed.
+    """
+    try:
+        import diskcache
+        return BackgroundJobManager(diskcache.Cache(directory), cache_by=[lambda: dataset_version],
+                                    expire=BACKGROUND_RESULT_EXPIRE)
+    except ImportError:
+        logger.warning("diskcache, multiprocess or psutil is not installed, the treemap is built in the request")
+        return None
+
+
+class BackgroundJobManager(DiskcacheManager):
+    """
+    DiskcacheManager that accepts jobs whose process is already gone. A finished job exits between the
+    checks of DiskcacheManager and its psutil calls, and with several workers another worker may have
+    terminated it already; both raised psutil.NoSuchProcess and failed the request polling the result.
+    """
+
+    def terminate_job(self, job):
+        import psutil
+        try:
+            super().terminate_job(job)
+        except psutil.NoSuchProcess:
+            pass
+
+    def job_running(self, job):
+        import psutil
+        try:
+            return super().job_running(job)
+        except psutil.NoSuchProcess:
+            return False
+
+
+def members_axis_title(rolled_up):
+    return "# regular members (sum of lowest units)" if rolled_up else "# regular members"
+
+def get_options(data_store, current_level, parent_filters, require_parent=False):
     """
     Get options for a dropdown based on the current level and all selected parent filters.
 
     Args:
-        dataframe (pd.DataFrame): The dataframe containing the hierarchical data.
+        data_store (DataStore): The read-only store of the loaded data.
         current_level (str): The column representing the current level (e.g., 'Level3').
         parent_filters (dict): A dictionary of parent levels and their selected values.
+        require_parent (bool): If True and no parent is selected, only the 'ALL' option is returned
+            (the dropdown is then filled by searching).
 
     Returns:
         list: A list of dictionaries with labels and values for the dropdown.
     """
-    # Map current levels to their corresponding ID_UnitType
-    level_to_unit_type = {
-        'LevelOddil': 'oddil',
-        'LevelStredisko': 'stredisko',
-        'LevelOkres': 'okres'
-    }
-
-    # Determine the valid unit type for the current level
-    current_unit_type = level_to_unit_type.get(current_level, None)
-
-    # Filter the dataframe for rows matching the current unit type
-    if current_unit_type:
-        filtered_dataframe = dataframe[dataframe['ID_UnitType'] == current_unit_type]
-    else:
-        # If the current level does not map to a specific ID_UnitType, use the full dataframe
-        filtered_dataframe = dataframe
-
-    # Apply all parent-level filters
-    for parent_level, parent_value in parent_filters.items():
-        if parent_value not in ['ALL', 'AL']:
-            if parent_level == 'LevelStredisko':
-                filtered_dataframe = filtered_dataframe[filtered_dataframe['RegistrationNumber'].str.contains(parent_filters['LevelStredisko'], na=False)]
-            else:
-                filtered_dataframe = filtered_dataframe[filtered_dataframe[parent_level] == parent_value]
+    filters = get_parent_keys(parent_filters)
+    if require_parent and not filters:
+        return [{'label': 'ALL', 'value': 'ALL'}]
 
     # Generate options for the dropdown
     return [{'label': 'ALL', 'value': 'ALL'}] + [
         {'label': name, 'value': id_}
-        for id_, name in filtered_dataframe[['RegistrationNumber', 'UnitName']].drop_duplicates().values
+        for id_, name in data_store.options(LEVEL_TO_UNIT_TYPE[current_level], filters)
     ]
 
+def search_options(data_store, current_level, search_value, parent_filters, selected_value=None):
+    """
+    Get at most SEARCH_RESULTS_LIMIT options matching the text typed into a dropdown.
+    The currently selected value is kept in the options so the dropdown can still show its label.
+    """
+    matches = data_store.search(LEVEL_TO_UNIT_TYPE[current_level], search_value,
+                                get_parent_keys(parent_filters), limit=SEARCH_RESULTS_LIMIT)
+    if selected_value not in (None, 'ALL') and all(id_ != selected_value for id_, _ in matches):
+        matches.insert(0, (selected_value, data_store.option_name(selected_value) or selected_value))
+    return [{'label': 'ALL', 'value': 'ALL'}] + [{'label': name, 'value': id_} for id_, name in matches]
+
+def get_parent_keys(parent_filters):
+    """Translate the selected parent-level values to the parent keys of the hierarchy index."""
+    # Apply all parent-level filters ('AL' is the shortened 'ALL' of the kraj dropdown)
+    return {
+        PARENT_LEVEL_TO_UNIT_TYPE[parent_level]: parent_value
+        for parent_level, parent_value in parent_filters.items()
+        if parent_value not in ['ALL', 'AL']
+    }
+
+def resolve_selection(level0_value, level1_value, level2_value, level3_value):
+    """
+    Determine the most specific selected level of the dropdowns.
+
+    Returns:
+        tuple: (level name, registration number), (None, None) when everything is 'ALL'.
+    """
+    if level3_value != 'ALL':
+        return 'oddil', level3_value
+    if level2_value != 'ALL':
+        return 'stredisko', level2_value
+    if level1_value != 'ALL':
+        return 'okres', level1_value
+    if level0_value != 'ALL':
+        return 'kraj', level0_value
+    return None, None
+
 def get_kraj_for_okres( okres_value):
 
     kraj_value = okres_value[:2] + '0'
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Default memory limit of the figure cache
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Longer arrays of a figure are sized from this many of their elements, see estimate_size
+SIZE_SAMPLE = 64
+
+
+class FigureCache:
+    """
+    LRU cache of plotly figures shared by the dashboard callbacks.
+    The size of an entry is the estimated length of its JSON serialization, the cache evicts the least
+    recently used figures once their total size exceeds max_bytes. Entries older than ttl seconds are rebuilt.
+    The cache is cleared whenever a different dataset is bound to it with set_dataset().
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+        """
+        Parameters:
+            max_bytes (int): Maximum total size of the cached figures, 0 disables the cache.
+            ttl (float): Maximum age of an entry in seconds, None keeps entries until they are evicted.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.dataset_version = None
+        self._entries = OrderedDict()  # key -> (figure, size in bytes, creation time)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _caches.add(self)
+
+    def set_dataset(self, dataset_version):
+        """Bind the cache to a version of the dataset, cached figures of another version are dropped."""
+        with self._lock:
+            if dataset_version != self.dataset_version:
+                self._entries.clear()
+                self._size = 0
+                self.dataset_version = dataset_version
+
+    def get(self, key):
+        """Return the cached figure for key, or None if it is not cached or too old."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[2] <= self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def get_or_build(self, key, build):
+        """
+        Return the cached figure for key, or build, store and return it.
+        Parameters:
+            key (tuple): Normalized inputs of the figure, including the name of the chart.
+            build (callable): Function without arguments that creates the figure.
+        """
+        figure = self.get(key)
+        if figure is None:
+            # Build outside the lock, so slow figures do not block cache hits of other requests
+            figure = build()
+            self.put(key, figure)
+        return figure
+
+    def put(self, key, figure):
+        """Store a figure, evicting the least recently used ones if the cache gets too large."""
+        if self.max_bytes <= 0:
+            return
+        size = estimate_size(figure)
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return  # Would evict everything else and still not fit
+            self._entries[key] = (figure, size, time.monotonic())
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Counters for sizing the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Caches of this process. Background callback jobs are forked from a worker while other threads (the
+# warm-up) may hold a cache lock, the child gets new locks
+_caches = weakref.WeakSet()
+
+
+def _reset_locks():
+    for cache in _caches:
+        cache._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_locks)
+
+
+def estimate_size(figure):
+    """
+    Approximate length of the JSON of a figure, without serializing it (Dash does that for every
+    response anyway). Arrays longer than SIZE_SAMPLE are extrapolated from evenly spaced elements.
+    """
+    if hasattr(figure, '_data'):
+        # The properties of a plotly figure, to_dict() would deep copy them
+        return _json_length({'data': figure._data, 'layout': figure._layout})
+    return _json_length(figure)
+
+
+def _json_length(value):
+    if isinstance(value, str):
+        return _escaped_length(value) + 2
+    if isinstance(value, dict):
+        try:
+            text = json.dumps(value, ensure_ascii=False, separators=(',', ':'))  # E.g. the layout and its template
+            return _escaped_length(text)
+        except (TypeError, ValueError):
+            return 1 + sum(len(str(key)) + 4 + _json_length(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, np.ndarray, pd.Series, pd.Index)):
+        if len(value) > SIZE_SAMPLE:
+            step = len(value) // SIZE_SAMPLE
+            sample = value[::step][:SIZE_SAMPLE]
+            sample = sample.tolist() if hasattr(sample, 'tolist') else list(sample)
+            return 2 + (_json_length(sample) - 2) * len(value) // len(sample)
+        items = value.tolist() if hasattr(value, 'tolist') else value
+        return 2 + sum(_json_length(item) + 1 for item in items)
+    if value is None:
+        return 4
+    return len(str(value))
+
+
+def _escaped_length(text):
+    # plotly writes '/', '<' and '>' as \u002f, \u003c and \u003e, so the JSON is safe inside HTML
+    return len(text) + 5 * (text.count('/') + text.count('<') + text.count('>'))
+
+
+def dataset_version(df):
+    """Content hash of a DataFrame, used to tell whether the loaded dataset changed."""
+    return int(pd.util.hash_pandas_object(df, index=False).sum())
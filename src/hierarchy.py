@@ -0,0 +1,209 @@
+import bisect
+import unicodedata
+
+import pandas as pd
+
+# Unit types from the top of the organisation down, each one is the parent of the next
+UNIT_LEVELS = ['kraj', 'okres', 'stredisko', 'oddil', 'druzina']
+
+
+class HierarchyIndex:
+    """
+    Parent -> children index over registration numbers, built once from the merged DataFrame.
+    Every distinct (RegistrationNumber, UnitName) pair of a unit type is stored once, in the order
+    of its first row, together with the keys of its parents:
+        kraj      - LevelKraj, e.g. '11' for '111.01.001'
+        okres     - LevelOkres, e.g. '111'
+        stredisko - okres and stredisko part, e.g. '111.01'
+        oddil     - the number without the druzina suffix, e.g. '111.01.001'
+    Option lists are then dictionary lookups over the children of the most specific selected parent,
+    searches bisect sorted names and registration numbers instead of testing every unit.
+    """
+
+    def __init__(self, df):
+        """
+        Parameters:
+            df (pd.DataFrame): The merged DataFrame after add_hierarchy_levels.
+        """
+        units = df[df['ID_UnitType'].isin(UNIT_LEVELS)]
+        units = units[['ID_UnitType', 'RegistrationNumber', 'UnitName', 'LevelKraj', 'LevelOkres', 'LevelStredisko']]
+        units = units.drop_duplicates(['ID_UnitType', 'RegistrationNumber', 'UnitName']).astype(object)
+
+        registration_numbers = units['RegistrationNumber']
+        has_stredisko = units['LevelStredisko'] != 'Unknown'
+        keys = pd.DataFrame({
+            'kraj': units['LevelKraj'],
+            'okres': units['LevelOkres'],
+            'stredisko': (units['LevelOkres'] + '.' + units['LevelStredisko']).where(has_stredisko),
+            'oddil': registration_numbers.str.split('-', n=1).str[0].where(registration_numbers.str.count(r'\.') >= 2),
+        })
+
+        self.units = {level: [] for level in UNIT_LEVELS}  # unit type -> [(registration number, name, parent keys)]
+        self.children_by_parent = {level: {} for level in UNIT_LEVELS}  # unit type -> parent level -> key -> [units]
+        self.unit_types = {}  # registration number -> unit type
+        self.names = {}  # registration number -> name of its first row
+        self.own_keys = {}  # registration number -> key under which its children are indexed
+        self.search_keys = {}  # (registration number, name) -> normalized name used by search
+
+        for unit_type, registration_number, name, *parent_keys in zip(
+                units['ID_UnitType'], registration_numbers, units['UnitName'],
+                keys['kraj'], keys['okres'], keys['stredisko'], keys['oddil']):
+            parents = dict(zip(UNIT_LEVELS, parent_keys))
+            unit = (registration_number, name, parents)
+            self.units[unit_type].append(unit)
+            for parent_level in UNIT_LEVELS[:UNIT_LEVELS.index(unit_type)]:
+                by_key = self.children_by_parent[unit_type].setdefault(parent_level, {})
+                by_key.setdefault(parents[parent_level], []).append(unit)
+            self.unit_types.setdefault(registration_number, unit_type)
+            self.names.setdefault(registration_number, name)
+            self.own_keys.setdefault(registration_number, parents.get(unit_type))
+            self.search_keys[(registration_number, name)] = normalize_search_text(name)
+
+        # Sorted keys for the prefix matches of search(), per unit type. A unit is identified by its position
+        # in self.units, which is also the order of options().
+        self._search_indexes = {unit_type: self._build_search_index(units) for unit_type, units in self.units.items()}
+
+    def _build_search_index(self, units):
+        names = []  # sorted (normalized name, position)
+        registration_numbers = []  # sorted (registration number, position)
+        words = {}  # word of a normalized name -> positions of the names containing it
+        lines = []  # normalized name and registration number of every unit, for the substring matches
+        for position, (registration_number, name, _) in enumerate(units):
+            text = self.search_keys[(registration_number, name)]
+            names.append((text, position))
+            registration_numbers.append((registration_number, position))
+            for word in text.split():
+                words.setdefault(word, set()).add(position)
+            lines.append(f"{text}\t{registration_number}")
+        names.sort()
+        registration_numbers.sort()
+        # A searched word has no whitespace, so a match in the joined text lies within one unit's name or number
+        line_starts = [0]
+        for line in lines:
+            line_starts.append(line_starts[-1] + len(line) + 1)
+        return {'names': names, 'registration_numbers': registration_numbers,
+                'words': words, 'sorted_words': sorted(words), 'text': '\n'.join(lines), 'line_starts': line_starts}
+
+    def options(self, unit_type, parent_filters=None):
+        """
+        Units of one type below the selected parents.
+        Parameters:
+            unit_type (str): Type of the listed units ('okres', 'stredisko', 'oddil', ...).
+            parent_filters (dict): Parent level -> key, e.g. {'kraj': '11', 'okres': '111'}.
+                Values of None or 'ALL' are ignored.
+        Returns:
+            list: (registration number, name) pairs in the order of their first row.
+        """
+        parent_filters = {level: key for level, key in (parent_filters or {}).items() if key not in (None, 'ALL')}
+
+        # Start from the children of the most specific parent, check the remaining parents on them
+        candidates = self.units[unit_type]
+        for level in reversed(UNIT_LEVELS):
+            if level in parent_filters:
+                candidates = self.children_by_parent[unit_type].get(level, {}).get(parent_filters[level], [])
+                break
+        return [
+            (registration_number, name)
+            for registration_number, name, parents in candidates
+            if all(parents[level] == key for level, key in parent_filters.items())
+        ]
+
+    def search(self, unit_type, query, parent_filters=None, limit=50):
+        """
+        Units of one type whose name or registration number matches a search text.
+        Matching ignores case and diacritics. Names starting with the text come first, then names where
+        every searched word starts a word of the name, then names or registration numbers containing every word.
+        Parameters:
+            unit_type (str): Type of the searched units.
+            query (str): The search text.
+            parent_filters (dict): Parent keys restricting the search, see options().
+            limit (int): Maximum number of results.
+        Returns:
+            list: (registration number, name) pairs, best matches first.
+        """
+        query = normalize_search_text(query)
+        if not query:
+            return []
+        query_words = query.split()
+        parent_filters = {level: key for level, key in (parent_filters or {}).items() if key not in (None, 'ALL')}
+        index = self._search_indexes[unit_type]
+        units = self.units[unit_type]
+
+        # Prefix matches from the sorted keys, in the order of options()
+        starts = _prefixed(index['names'], query) | _prefixed(index['registration_numbers'], query)
+        word_starts = None
+        for query_word in query_words:
+            matches = set()
+            for word in _prefixed_words(index['sorted_words'], query_word):
+                matches |= index['words'][word]
+            word_starts = matches if word_starts is None else word_starts & matches
+        ranked = [
+            position
+            for positions in (starts, word_starts - starts)
+            for position in sorted(positions)
+            if self._matches_parents(unit_type, units[position][2], parent_filters)
+        ]
+        results = [units[position][:2] for position in ranked[:limit]]
+
+        # Substring matches only fill up the remaining results. This pass scans the joined text of all units
+        # of the type for the longest searched word, the others are checked on the units it finds.
+        if len(results) < limit:
+            found = set(ranked)
+            text, line_starts = index['text'], index['line_starts']
+            longest = max(query_words, key=len)
+            start = text.find(longest)
+            while start != -1:
+                position = bisect.bisect_right(line_starts, start) - 1
+                start = text.find(longest, line_starts[position + 1])
+                registration_number, name, parents = units[position]
+                line = text[line_starts[position]:line_starts[position + 1] - 1]
+                if (position not in found and all(query_word in line for query_word in query_words)
+                        and self._matches_parents(unit_type, parents, parent_filters)):
+                    results.append((registration_number, name))
+                    if len(results) == limit:
+                        break
+        return results
+
+    @staticmethod
+    def _matches_parents(unit_type, parents, parent_filters):
+        # Same condition as options(): only levels above the unit type select units
+        depth = UNIT_LEVELS.index(unit_type)
+        return all(UNIT_LEVELS.index(level) < depth and parents[level] == key for level, key in parent_filters.items())
+
+    def children(self, registration_number):
+        """
+        Direct children of a unit, e.g. the okresy of a kraj.
+        Returns:
+            list: (registration number, name) pairs, empty for unknown units and for druziny.
+        """
+        unit_type = self.unit_types.get(registration_number)
+        if unit_type is None or unit_type == UNIT_LEVELS[-1]:
+            return []
+        child_type = UNIT_LEVELS[UNIT_LEVELS.index(unit_type) + 1]
+        return self.options(child_type, {unit_type: self.own_keys[registration_number]})
+
+
+def _prefixed(sorted_keys, prefix):
+    # Positions of the (key, position) pairs whose key starts with prefix
+    positions = set()
+    for i in range(bisect.bisect_left(sorted_keys, (prefix,)), len(sorted_keys)):
+        key, position = sorted_keys[i]
+        if not key.startswith(prefix):
+            break
+        positions.add(position)
+    return positions
+
+
+def _prefixed_words(sorted_words, prefix):
+    for i in range(bisect.bisect_left(sorted_words, prefix), len(sorted_words)):
+        if not sorted_words[i].startswith(prefix):
+            break
+        yield sorted_words[i]
+
+
+def normalize_search_text(text):
+    """Lowercase text without diacritics, e.g. 'Středisko Řehoř' -> 'stredisko rehor'."""
+    if not isinstance(text, str):
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().strip()
@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from dash.exceptions import PreventUpdate
+from flask import Response, g, has_request_context, request
+
+# Path of the Dash endpoint that runs the callbacks
+UPDATE_PATH = '/_dash-update-component'
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Parts of a callback request:
+#   query     - reading the data store, timed with phase('query') inside the callbacks
+#   build     - the rest of the callback, mostly creating the figures
+#   serialize - Dash encoding the outputs as JSON, from the return of the callback to the response
+#   job       - a background callback running in its job process, reported on the first poll after it finished
+PHASES = ('query', 'build', 'serialize', 'job')
+# Jobs whose duration was not picked up by a poll (e.g. cancelled ones) are dropped after this many seconds
+JOB_TIMING_EXPIRE = 3600
+
+
+class CallbackMetrics:
+    """
+    Latency and payload metrics of the Dash callbacks.
+    Every request to the callback endpoint is split into the PHASES, the durations are returned in a
+    Server-Timing header and summed per callback. /metrics exposes the sums in the Prometheus text format.
+    The metrics are kept per process, with several gunicorn workers every worker reports its own requests.
+    A request is attributed to a callback by its output, so the start and poll requests of a background
+    callback are counted too. The job itself runs in another process, see track_jobs().
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._callbacks = {}  # callback name -> counters, see _observe
+        self._outputs = {}  # output key of the update requests -> callback name
+        self.job_store = None
+
+    def track_jobs(self, store):
+        """
+        Time background callback jobs. The job writes its duration into store under its process id,
+        the poll request with that job id takes it out again and reports it as the job phase.
+        Parameters:
+            store: Cache shared with the job processes, with set(key, value, expire=...) and pop(key),
+                e.g. the diskcache.Cache of the DiskcacheManager.
+        """
+        self.job_store = store
+
+    def install(self, app):
+        """Add the request hooks and the /metrics endpoint to the Flask server of a Dash app."""
+        app.server.before_request(self._start_request)
+        app.server.after_request(self._finish_request)
+        app.server.add_url_rule('/metrics', 'callback_metrics', self.metrics_response)
+
+    def callback(self, app):
+        """
+        Drop-in replacement of app.callback: the decorated function is instrumented, then registered.
+        Usage:
+            callback = metrics.callback(app)
+            @callback(Output(...), Input(...))
+            def update(...):
+        """
+        def register(*args, **kwargs):
+            def decorator(function):
+                registered = set(app.callback_map)
+                result = app.callback(*args, **kwargs)(self.instrument(function))
+                for output in set(app.callback_map) - registered:
+                    self._outputs[output] = function.__name__
+                return result
+            return decorator
+        return register
+
+    def instrument(self, function):
+        """Wrap a callback so the current request is attributed to it and its duration is recorded."""
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            timing = g.get('callback_timing') if has_request_context() else None
+            if timing is not None and timing['pid'] != os.getpid() and self.job_store is not None:
+                return self._run_job(function, args, kwargs)
+            timing = _request_timing()
+            if timing is None:
+                return function(*args, **kwargs)
+
+            timing['callback'] = function.__name__
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except PreventUpdate:
+                raise
+            except Exception:
+                timing['error'] = True
+                raise
+            finally:
+                timing['callback_end'] = time.perf_counter()
+                timing['callback_time'] = timing['callback_end'] - start
+        return wrapper
+
+    def _run_job(self, function, args, kwargs):
+        # In a background job process, forked during the request that started it: its pid is the job id
+        # the browser polls with
+        start = time.perf_counter()
+        error = False
+        try:
+            return function(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.job_store.set(f"callback-job-{os.getpid()}",
+                               {'seconds': time.perf_counter() - start, 'error': error}, expire=JOB_TIMING_EXPIRE)
+
+    def _start_request(self):
+        if request.path.endswith(UPDATE_PATH):
+            g.callback_timing = {'start': time.perf_counter(), 'query': 0.0, 'pid': os.getpid()}
+            body = request.get_json(silent=True)
+            name = self._outputs.get(body.get('output')) if isinstance(body, dict) else None
+            if name is not None:
+                g.callback_timing['callback'] = name
+
+    def _finish_request(self, response):
+        timing = g.pop('callback_timing', None)
+        if timing is None or 'callback' not in timing:
+            return response
+
+        end = time.perf_counter()
+        total = end - timing['start']
+        callback_time = timing.get('callback_time', 0.0)
+        durations = {
+            'query': timing['query'],
+            'build': max(0.0, callback_time - timing['query']),
+            'serialize': end - timing.get('callback_end', end),
+            'job': 0.0,
+        }
+        job = request.args.get('job')
+        if job and self.job_store is not None:
+            job_timing = self.job_store.pop(f"callback-job-{job}")
+            if job_timing is not None:
+                durations['job'] = job_timing['seconds']
+                timing['error'] = timing.get('error', False) or job_timing['error']
+        size = response.calculate_content_length()
+        if size is None:
+            size = 0 if response.is_streamed else len(response.get_data())
+        self._observe(timing['callback'], total, durations, size, timing.get('error', False))
+
+        response.headers['Server-Timing'] = ', '.join(
+            [f"{phase};dur={durations[phase] * 1000:.1f}" for phase in PHASES] + [f"total;dur={total * 1000:.1f}"]
+        )
+        return response
+
+    def _observe(self, name, total, durations, size, error):
+        with self._lock:
+            counters = self._callbacks.get(name)
+            if counters is None:
+                counters = self._callbacks[name] = {
+                    'requests': 0,
+                    'errors': 0,
+                    'buckets': [0] * len(self.buckets),
+                    'seconds': 0.0,
+                    'phases': dict.fromkeys(PHASES, 0.0),
+                    'bytes': 0,
+                }
+            counters['requests'] += 1
+            counters['errors'] += error
+            counters['seconds'] += total
+            counters['bytes'] += size
+            for phase, duration in durations.items():
+                counters['phases'][phase] += duration
+            for i, bound in enumerate(self.buckets):
+                if total <= bound:
+                    counters['buckets'][i] += 1
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            callbacks = {name: {**counters, 'buckets': list(counters['buckets']), 'phases': dict(counters['phases'])}
+                         for name, counters in sorted(self._callbacks.items())}
+
+        lines = [
+            '# HELP dashboard_callback_requests_total Callback requests.',
+            '# TYPE dashboard_callback_requests_total counter',
+        ]
+        lines += [f'dashboard_callback_requests_total{{callback="{name}"}} {c["requests"]}' for name, c in callbacks.items()]
+        lines += [
+            '# HELP dashboard_callback_errors_total Callback requests that raised an exception.',
+            '# TYPE dashboard_callback_errors_total counter',
+        ]
+        lines += [f'dashboard_callback_errors_total{{callback="{name}"}} {c["errors"]}' for name, c in callbacks.items()]
+        lines += [
+            '# HELP dashboard_callback_duration_seconds Wall time of callback requests.',
+            '# TYPE dashboard_callback_duration_seconds histogram',
+        ]
+        for name, c in callbacks.items():
+            lines += [f'dashboard_callback_duration_seconds_bucket{{callback="{name}",le="{bound:g}"}} {count}'
+                      for bound, count in zip(self.buckets, c['buckets'])]
+            lines += [
+                f'dashboard_callback_duration_seconds_bucket{{callback="{name}",le="+Inf"}} {c["requests"]}',
+                f'dashboard_callback_duration_seconds_sum{{callback="{name}"}} {c["seconds"]:.6f}',
+                f'dashboard_callback_duration_seconds_count{{callback="{name}"}} {c["requests"]}',
+            ]
+        lines += [
+            '# HELP dashboard_callback_phase_seconds_total Wall time of callback requests per phase.',
+            '# TYPE dashboard_callback_phase_seconds_total counter',
+        ]
+        lines += [f'dashboard_callback_phase_seconds_total{{callback="{name}",phase="{phase}"}} {seconds:.6f}'
+                  for name, c in callbacks.items() for phase, seconds in c['phases'].items()]
+        lines += [
+            '# HELP dashboard_callback_response_bytes_total Size of the callback responses.',
+            '# TYPE dashboard_callback_response_bytes_total counter',
+        ]
+        lines += [f'dashboard_callback_response_bytes_total{{callback="{name}"}} {c["bytes"]}' for name, c in callbacks.items()]
+        return '\n'.join(lines) + '\n'
+
+    def metrics_response(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _request_timing():
+    # The timing of the current callback request. A background job is forked with a copy of the request
+    # context of its start request, its timing belongs to the parent process and is never reported.
+    timing = g.get('callback_timing') if has_request_context() else None
+    if timing is None or timing['pid'] != os.getpid():
+        return None
+    return timing
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the time spent in the block to a phase of the current callback request, e.g.
+        with phase('query'):
+            years, members = data_store.series(unit)
+    Outside of a callback request (startup, background threads) the block just runs.
+    """
+    timing = _request_timing()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing[name] = timing.get(name, 0.0) + time.perf_counter() - start
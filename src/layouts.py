@@ -138,12 +138,8 @@ def create_layout(merged_dataframe):
                                             html.Label("Select Group (Středisko):"),
                                             dcc.Dropdown(
                                                 id='level2-dropdown',
-                                                options=[{'label': 'ALL', 'value': 'ALL'}] + [
-                                                    {'label': unit_name, 'value': registration_number}
-                                                    for registration_number, unit_name in merged_dataframe[
-                                                        merged_dataframe['ID_UnitType'] == "stredisko"
-                                                        ][['RegistrationNumber', 'UnitName']].drop_duplicates().values
-                                                ],
+                                                # Filled on demand by the search callback or the selected parent
+                                                options=[{'label': 'ALL', 'value': 'ALL'}],
                                                 value='ALL',
                                                 clearable=False,
                                             )
@@ -156,12 +152,8 @@ def create_layout(merged_dataframe):
                                             html.Label("Select Troop (Oddíl):"),
                                             dcc.Dropdown(
                                                 id='level3-dropdown',
-                                                options=[{'label': 'ALL', 'value': 'ALL'}] + [
-                                                    {'label': unit_name, 'value': registration_number}
-                                                    for registration_number, unit_name in merged_dataframe[
-                                                        merged_dataframe['ID_UnitType'] == "oddil"
-                                                        ][['RegistrationNumber', 'UnitName']].drop_duplicates().values
-                                                ],
+                                                # Filled on demand by the search callback or the selected parent
+                                                options=[{'label': 'ALL', 'value': 'ALL'}],
                                                 value='ALL',
                                                 clearable=False,
                                             )
@@ -179,6 +171,21 @@ def create_layout(merged_dataframe):
                                                 className="reset-button",
                                             )
                                         ]
+                                    ),
+                                    # Column 6: Reported totals of the unit or the sums over the lowest units of its subtree
+                                    html.Div(
+                                        className="dropdown-container",
+                                        children=[
+                                            html.Label("Totals:"),
+                                            dcc.RadioItems(
+                                                id='totals-mode',
+                                                options=[
+                                                    {'label': 'Reported', 'value': 'reported'},
+                                                    {'label': 'Sum of lowest units', 'value': 'rolled-up'},
+                                                ],
+                                                value='reported',
+                                            )
+                                        ]
                                     )
                                 ]
                             )
@@ -204,6 +211,7 @@ def create_layout(merged_dataframe):
                 className='blue-box',
                 style={"flex": 1},
                 children=[html.Div(id="treemap-trigger"),
+                          dcc.Store(id='treemap-request'),  # Year and clicked node of the treemap being built
                           html.Div(
                               className="treemap-section",
                               children=[
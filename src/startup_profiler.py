@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """
+    Wall time and resident memory of the startup phases of the dashboard.
+    Phases can be nested, a phase includes the time and memory of the phases inside it. The report is
+    logged once the app is ready to serve, so slow restarts can be traced to a phase.
+    Uses only the standard library, so it can be imported before the heavy modules it measures.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []  # {'phase', 'depth', 'seconds', 'memory_before', 'memory_after'} in start order
+        self._depth = 0
+
+    @contextmanager
+    def phase(self, name):
+        """Measure the block as one phase."""
+        entry = {'phase': name, 'depth': self._depth, 'seconds': None,
+                 'memory_before': current_memory(), 'memory_after': None}
+        self.phases.append(entry)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            entry['memory_after'] = current_memory()
+            self._depth -= 1
+
+    def wrap(self, function):
+        """
+        Measure every call of a function as a phase named after it.
+        The wrapper keeps the name and qualified name of the function, e.g. for the transform names in
+        the DataLoader snapshot.
+        """
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.phase(function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def report(self, path=None):
+        """
+        Log the time and memory of all phases.
+        Parameters:
+            path (str): If given, the report is also written to this JSON file.
+        """
+        total = time.perf_counter() - self.start
+        memory = current_memory()
+        lines = [f"Startup finished in {total:.2f} s, resident memory {format_memory(memory)}"]
+        for entry in self.phases:
+            before, after = entry['memory_before'], entry['memory_after']
+            change = f"{(after - before) / 2**20:+8.1f} MiB" if before is not None and after is not None else '         n/a'
+            name = '  ' * entry['depth'] + entry['phase']
+            lines.append(f"  {name:<32} {entry['seconds'] or 0:7.2f} s {change}")
+        logger.info('\n'.join(lines))
+
+        if path:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'total_seconds': total, 'memory': memory, 'phases': self.phases}, file, indent=2)
+
+
+def current_memory():
+    """Resident memory of this process in bytes, None if it cannot be read."""
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    # Other platforms, if psutil is installed
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def format_memory(size):
+    return f"{size / 2**20:.1f} MiB" if size is not None else 'n/a'
@@ -1,5 +1,24 @@
+import logging
+
+import numpy as np
 import pandas as pd
-import plotly.express as px
+
+logger = logging.getLogger(__name__)
+
+# Registration number parts used by add_hierarchy_levels
+HIERARCHY_PATTERN = (
+    r'^(?=(?:.*-(?P<druzina>\d+)$)?)'
+    r'(?P<okres>[^.]*)'
+    r'(?:\.(?P<stredisko>[^.]*)(?:\.(?P<oddil>[^.-]*)-[^.]*)?)?'
+)
+
+# Columns read by the layout and the callbacks, compact_dataframe drops the rest
+DASHBOARD_COLUMNS = [
+    'RegistrationNumber', 'UnitName', 'ID_UnitType', 'Year',
+    'RegularMembers', 'MembersTo6', 'MembersTo15', 'MembersTo18', 'MembersTo26', 'MembersFrom26',
+    'LevelKraj', 'LevelOkres', 'LevelStredisko',
+    'LevelKrajWhole', 'LevelOkresWhole', 'LevelStrediskoWhole', 'LevelOddilWhole', 'LevelDruzinaWhole',
+]
 
 def add_hierarchy_levels(df):
     """
@@ -8,14 +27,22 @@ def add_hierarchy_levels(df):
     # Ensure RegistrationNumber is a string
     df['RegistrationNumber'] = df['RegistrationNumber'].fillna('').astype(str)
 
-    # Extract hierarchy levels
-    df['LevelKraj'] = df['RegistrationNumber'].str.split('.').apply(lambda x: x[0][:2] if len(x) > 0 else 'Unknown')
-    df['LevelOkres'] = df['RegistrationNumber'].str.split('.').apply(lambda x: x[0] if len(x) > 0 else 'Unknown')
-    df['LevelStredisko'] = df['RegistrationNumber'].str.split('.').apply(lambda x: x[1] if len(x) > 1 else 'Unknown')
-    df['LevelOddil'] = df['RegistrationNumber'].str.split('.').apply(
-        lambda x: x[2].split('-')[0] if len(x) > 2 and '-' in x[2] else 'Unknown'
-    )
-    df['LevelDruzina'] = df['RegistrationNumber'].str.extract(r'-(\d+)$', expand=False).fillna('Unknown')
+    # Extract all hierarchy levels in one vectorized pass, e.g. '111.01.001-01':
+    #   druzina   - digits after the last '-' at the end of the number ('01')
+    #   okres     - everything before the first '.' ('111'), kraj is its first two characters
+    #   stredisko - the part between the first and second '.' ('01')
+    #   oddil     - the third part up to its first '-', only when the third part contains a '-' ('001')
+    # Every unit repeats once per year, so only the distinct numbers are parsed and the result is
+    # broadcast back to the rows
+    codes, uniques = pd.factorize(df['RegistrationNumber'])
+    levels = pd.Series(uniques, dtype=object).str.extract(HIERARCHY_PATTERN).take(codes)
+    levels.index = df.index
+
+    df['LevelKraj'] = levels['okres'].str[:2]
+    df['LevelOkres'] = levels['okres']
+    df['LevelStredisko'] = levels['stredisko'].fillna('Unknown')
+    df['LevelOddil'] = levels['oddil'].fillna('Unknown')
+    df['LevelDruzina'] = levels['druzina'].fillna('Unknown')
 
 
     return df
@@ -37,42 +64,72 @@ def add_hierarchy_levels_whole(df):
 
     return df
 
-def add_hierarchy_levels_text(df):
+def add_hierarchy_levels_text(df, export_path=None):
     """
-    Add hierarchy level columns to the DataFrame based on the RegistrationNumber column.
+    Add hierarchy level columns with the unit names of all parent units, based on the RegistrationNumber column.
+    Parameters:
+        df (pd.DataFrame): The merged DataFrame, it is not modified.
+        export_path (str): If given, the resulting DataFrame is also written to this CSV file.
     """
-    df =df.copy()
-    # Ensure RegistrationNumber is a string
-    df['RegistrationNumber'] = df['RegistrationNumber'].fillna('').astype(str)
-
-    registration_dict = df.set_index('RegistrationNumber')['UnitName'].to_dict()
-
-    # Extract hierarchy levels
-    def add_hierarchy_levels_text(df):
-        """
-        Add hierarchy level columns to the DataFrame based on the RegistrationNumber column using a dictionary.
-        """
-    # Make a copy to avoid modifying the original DataFrame
-    df = df.copy()
+    # Shallow copy: the new columns do not touch the original DataFrame and no data is copied
+    df = df.copy(deep=False)
 
     # Ensure RegistrationNumber is a string
     df['RegistrationNumber'] = df['RegistrationNumber'].fillna('').astype(str)
 
-    # Create the dictionary for fast lookups
-    registration_dict = df.set_index('RegistrationNumber')['UnitName'].to_dict()
+    # Unit name index, the last row of every registration number wins (as in a dict built from the rows).
+    # The extra ' ' at the end is what a missing parent resolves to (position -1).
+    names = df.drop_duplicates('RegistrationNumber', keep='last')
+    name_index = pd.Index(names['RegistrationNumber'])
+    name_lookup = np.append(names['UnitName'].to_numpy(dtype=object), ' ')
+
+    # Resolve the parents of every distinct registration number once and broadcast back to the rows
+    codes, uniques = pd.factorize(df['RegistrationNumber'])
+    uniques = pd.Series(uniques, dtype=object)
+    lengths = uniques.str.len().to_numpy()
+    parents = {
+        'LevelKrajWhole': (uniques.str[:2] + '0', 1),
+        'LevelOkresWhole': (uniques.str[:3], 2),
+        'LevelStrediskoWhole': (uniques.str[:6], 5),
+        'LevelOddilWhole': (uniques.str[:10], 9),
+    }
+    for column, (prefixes, min_length) in parents.items():
+        positions = np.where(lengths > min_length, name_index.get_indexer(prefixes), -1)
+        df[column] = name_lookup[positions].take(codes)
+    df['LevelDruzinaWhole'] = df['RegistrationNumber']  # DruzinaWhole is the full RegistrationNumber
+
+    if export_path:
+        df.to_csv(export_path, index=False)
 
-    # Use the dictionary for hierarchy levels
-    df['LevelKrajWhole'] = df['RegistrationNumber'].apply(lambda x: registration_dict.get(x[:2]+"0", ' ') if len(x) > 1 else ' ')
-    df['LevelOkresWhole'] = df['RegistrationNumber'].apply(lambda x: registration_dict.get(x[:3], ' ') if len(x) > 2 else ' ')
-    df['LevelStrediskoWhole'] = df['RegistrationNumber'].apply(lambda x: registration_dict.get(x[:6], ' ') if len(x) > 5 else ' ')
-    df['LevelOddilWhole'] = df['RegistrationNumber'].apply(lambda x: registration_dict.get(x[:10], ' ') if len(x) > 9 else ' ')
-    df['LevelDruzinaWhole'] = df['RegistrationNumber'].fillna(' ')  # Assuming DruzinaWhole is the full RegistrationNumber
-    df.to_csv('new_dataframe.csv', index=False)
+    return df
 
+def compact_dataframe(df, columns=None):
+    """
+    Shrink the merged DataFrame after the hierarchy columns were added: keep only the columns the
+    dashboard reads, store repeated strings as categoricals and downcast Year and the member counts.
+    Parameters:
+        df (pd.DataFrame): The merged DataFrame.
+        columns (list): Columns to keep, defaults to DASHBOARD_COLUMNS.
+    """
+    columns = DASHBOARD_COLUMNS if columns is None else columns
+    before = df.memory_usage(deep=True).sum()
+
+    df = df[[column for column in columns if column in df.columns]].copy()
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].astype('category')
+        elif pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif pd.api.types.is_float_dtype(df[column]):
+            # Counts with missing values stay floats, float32 is exact up to 16 million
+            df[column] = pd.to_numeric(df[column], downcast='float')
+
+    after = df.memory_usage(deep=True).sum()
+    logger.info("Compacted dataset: %.1f MiB -> %.1f MiB", before / 2**20, after / 2**20)
     return df
 
 def get_kraj_name(kraj_value, merged_dataframe):
-    print("kraj_value",kraj_value)
+    logger.debug("kraj_value %s", kraj_value)
     unit_row = merged_dataframe[merged_dataframe['RegistrationNumber'] == kraj_value]
     if not unit_row.empty:
         return unit_row.sort_values(by='Year', ascending=False)['UnitName'].iloc[0]
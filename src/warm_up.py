@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Threads building figures in the background, kept low so the warm-up leaves CPU time to the requests
+DEFAULT_WORKERS = 1
+# Progress is logged every time another tenth of the figures is done
+PROGRESS_STEPS = 10
+
+
+class FigureWarmUp:
+    """
+    Builds figures into the figure cache in the background, so the first users after a start do not wait
+    for cold builds. The tasks run in a thread pool started from a daemon thread: the server keeps
+    serving meanwhile, and a request for a figure that is not built yet simply builds it itself.
+    Threads share the cache of their process, with several gunicorn workers every worker warms its own cache.
+    """
+
+    def __init__(self, tasks):
+        """
+        Parameters:
+            tasks (list): (name, function) pairs, the function builds one figure into the cache. The
+                tasks are started in this order, the most requested figures should come first.
+        """
+        self.tasks = list(tasks)
+        self.done = 0
+        self.errors = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, workers=DEFAULT_WORKERS):
+        """Start the warm-up without waiting for it, a second call does nothing."""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self.started = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, args=(workers,), name='figure-warm-up', daemon=True)
+        logger.info("Warm-up of %d figures started with %d threads", len(self.tasks), workers)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until the warm-up is finished, e.g. in the benchmarks. Returns False on a timeout."""
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self, workers):
+        total = len(self.tasks)
+        next_report = 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='figure-warm-up') as pool:
+            futures = {pool.submit(function): name for name, function in self.tasks}
+            for future in as_completed(futures):
+                error = future.exception()
+                with self._lock:
+                    self.done += 1
+                    self.errors += error is not None
+                    done = self.done
+                if error is not None:
+                    logger.warning("Warm-up of %s failed: %r", futures[future], error)
+                if done * PROGRESS_STEPS >= next_report * total:
+                    next_report = done * PROGRESS_STEPS // total + 1
+                    logger.info("Warm-up: %d/%d figures in %.1f s", done, total, time.perf_counter() - self.started)
+
+        with self._lock:
+            self.finished = time.perf_counter()
+        logger.info("Warm-up finished: %d figures in %.1f s, %d failed",
+                    total, self.finished - self.started, self.errors)
+
+    def progress(self):
+        """State of the warm-up for the /warm-up endpoint."""
+        with self._lock:
+            if self.started is None:
+                state, seconds = 'not started', 0.0
+            elif self.finished is None:
+                state, seconds = 'running', time.perf_counter() - self.started
+            else:
+                state, seconds = 'finished', self.finished - self.started
+            return {
+                'state': state,
+                'done': self.done,
+                'total': len(self.tasks),
+                'errors': self.errors,
+                'seconds': round(seconds, 3),
+            }
@@ -0,0 +1,34 @@
+"""
+Production entry point of the dashboard, served by gunicorn with the settings in gunicorn.conf.py:
+    gunicorn -c gunicorn.conf.py
+Importing this module loads and indexes the dataset and registers the callbacks. With preload_app the
+gunicorn master process does that once, the workers are forked from it and share its memory pages
+instead of loading their own copy of the data.
+"""
+import gc
+import os
+
+from app import app, data_store, startup_profiler
+from callbacks import register_callbacks
+
+with startup_profiler.phase('register_callbacks'):
+    warm_up = register_callbacks(app, data_store)
+startup_profiler.report(os.environ.get('DASHBOARD_STARTUP_REPORT'))
+
+# WSGI application for gunicorn
+server = app.server
+
+# Everything created so far lives as long as the process. Moving it out of the tracked generations keeps
+# the garbage collector of the workers from writing to these objects, which would copy the shared pages.
+gc.freeze()
+
+
+def start_warm_up():
+    """
+    Prebuild the figures of every year and kraj in the background, with DASHBOARD_WARM_UP threads.
+    Called in every worker from the post_fork hook in gunicorn.conf.py: threads are not copied by the
+    fork, and the figure cache of the master would not be shared anyway.
+    """
+    workers = int(os.environ.get('DASHBOARD_WARM_UP', 0))
+    if workers:
+        warm_up.start(workers)
@@ -0,0 +1,28 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules are imported as src.<module>, the data generator of the benchmarks is reused for fixtures
+for path in (ROOT, os.path.join(ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    """Generated source CSVs of two years, loaded and preprocessed as the app does. Tests must not modify it."""
+    from generate_data import generate_dataset
+    from src.DataLoader import DataLoader
+    from src.utils import add_hierarchy_levels, add_hierarchy_levels_text, compact_dataframe
+
+    directory = tmp_path_factory.mktemp('sources')
+    generate_dataset(str(directory), scale=0.2, years=2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = DataLoader(str(directory))
+        loader.load_all_csvs()
+        loader.normalize_and_merge()
+        return compact_dataframe(add_hierarchy_levels_text(add_hierarchy_levels(loader.get_merged_dataframe())))
@@ -0,0 +1,104 @@
+"""
+The treemap callback runs as a background job in another process, its requests and the duration of the
+job must still show up in the Server-Timing header and in /metrics. Cached treemaps are sent without a job.
+"""
+import contextlib
+import io
+import time
+
+import plotly.graph_objects as go
+import pytest
+from dash import Dash
+
+pytest.importorskip('diskcache')
+pytest.importorskip('multiprocess')
+psutil = pytest.importorskip('psutil')
+
+from dash_requests import find_dependency, update_request_body
+from src.DataStore import DataStore
+from src.callbacks import create_background_manager, register_callbacks
+from src.figure_cache import FigureCache
+from src.layouts import create_layout
+
+TREEMAP = 'hierarchy-treemap.figure'
+TREEMAP_SELECTION = '..treemap-request.data'
+CACHED_YEAR = 2023
+JOB_TIMEOUT = 60
+
+
+@pytest.fixture(scope='module')
+def figure_cache():
+    return FigureCache()
+
+
+@pytest.fixture(scope='module')
+def manager(tmp_path_factory):
+    return create_background_manager('test', str(tmp_path_factory.mktemp('background')))
+
+
+@pytest.fixture(scope='module')
+def client(dataset, figure_cache, manager):
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = Dash(__name__)
+        app.layout = create_layout(dataset)
+        register_callbacks(app, DataStore(dataset), figure_cache=figure_cache, background_manager=manager)
+    return app.server.test_client()
+
+
+def run_treemap_job(client):
+    dependency = find_dependency(client.get('/_dash-dependencies').get_json(), TREEMAP)
+    body = update_request_body(dependency, {'treemap-request.data': {'year': 2024, 'focus': None}},
+                               ['treemap-request.data'])
+    response = client.post('/_dash-update-component', json=body)
+    job = response.get_json()
+    assert 'job' in job
+    responses = [response]
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        response = client.post(f"/_dash-update-component?cacheKey={job['cacheKey']}&job={job['job']}", json=body)
+        responses.append(response)
+        if 'response' in response.get_json():
+            return responses
+    pytest.fail("The treemap job did not finish")
+
+
+def test_job_is_reported(client):
+    responses = run_treemap_job(client)
+    assert all('Server-Timing' in response.headers for response in responses)
+    assert any(not timing.startswith('job;dur=0.0')
+               for response in responses
+               for timing in response.headers['Server-Timing'].split(', ') if timing.startswith('job;'))
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    requests = [line for line in metrics.splitlines()
+                if line.startswith('dashboard_callback_requests_total{callback="generate_dynamic_treemap"}')]
+    assert requests and int(requests[0].split()[-1]) == len(responses)
+    job = [line for line in metrics.splitlines()
+           if line.startswith('dashboard_callback_phase_seconds_total{callback="generate_dynamic_treemap",phase="job"}')]
+    assert job and float(job[0].split()[-1]) > 0
+
+
+def select_treemap(client, year):
+    dependency = find_dependency(client.get('/_dash-dependencies').get_json(), TREEMAP_SELECTION)
+    body = update_request_body(dependency, {'year-slider.value': year}, ['year-slider.value'])
+    return client.post('/_dash-update-component', json=body).get_json()['response']
+
+
+def test_cached_treemap_is_sent_without_job(client, figure_cache):
+    figure_cache.put(('hierarchy-treemap', CACHED_YEAR, None), go.Figure(layout=dict(title='cached')))
+    response = select_treemap(client, CACHED_YEAR)
+    assert 'treemap-request' not in response
+    assert response['hierarchy-treemap']['figure']['layout']['title']['text'] == 'cached'
+
+    response = select_treemap(client, 2024)
+    assert response == {'treemap-request': {'data': {'year': 2024, 'focus': None}}}
+
+
+def test_exited_job_is_not_an_error(manager, monkeypatch):
+    process = psutil.Popen(['true'])
+    process.wait()
+    # The job exits right after psutil saw it
+    monkeypatch.setattr(psutil, 'pid_exists', lambda pid: True)
+    manager.terminate_job(process.pid)
+    assert not manager.job_running(process.pid)
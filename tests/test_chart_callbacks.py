@@ -0,0 +1,53 @@
+"""When only the year slider moves, the line chart is patched to the same figure as a full build."""
+import contextlib
+import copy
+import io
+
+import pytest
+from dash import Dash
+
+from dash_requests import find_dependency, update_request_body
+from src.DataStore import DataStore
+from src.callbacks import register_callbacks
+from src.figure_cache import FigureCache
+from src.layouts import create_layout
+
+CHARTS = '..line-chart.figure'
+
+
+@pytest.fixture(scope='module')
+def client(dataset):
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = Dash(__name__)
+        app.layout = create_layout(dataset)
+        register_callbacks(app, DataStore(dataset), figure_cache=FigureCache(max_bytes=0), background_manager=False)
+    return app.server.test_client()
+
+
+def line_chart(client, year, unit, changed):
+    dependency = find_dependency(client.get('/_dash-dependencies').get_json(), CHARTS)
+    values = {'year-slider.value': year, 'level0-dropdown.value': unit, 'totals-mode.value': 'reported'}
+    values.update({f'level{level}-dropdown.value': 'ALL' for level in range(1, 4)})
+    body = update_request_body(dependency, values, changed)
+    return client.post('/_dash-update-component', json=body).get_json()['response']['line-chart']['figure']
+
+
+def apply_patch(figure, patch):
+    figure = copy.deepcopy(figure)
+    for operation in patch['operations']:
+        assert operation['operation'] == 'Assign'
+        *path, last = operation['location']
+        target = figure
+        for key in path:
+            target = target[key]
+        target[last] = operation['params']['value']
+    return figure
+
+
+@pytest.mark.parametrize('unit', ['ALL', '110'])
+@pytest.mark.parametrize('year', [2023, 2024, 2030])
+def test_slider_patch_matches_full_build(client, unit, year):
+    figure = line_chart(client, 2023 if year != 2023 else 2024, unit, ['level0-dropdown.value'])
+    patch = line_chart(client, year, unit, ['year-slider.value'])
+    assert '__dash_patch_update' in patch
+    assert apply_patch(figure, patch)['data'] == line_chart(client, year, unit, ['level0-dropdown.value'])['data']
@@ -0,0 +1,50 @@
+"""
+The data store hands out its cached arrays to every request, none of them may be writeable.
+The batch lookup of the age groups matches the single lookups.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.DataStore import DataStore
+
+
+@pytest.fixture(scope='module')
+def store(dataset):
+    return DataStore(dataset)
+
+
+def test_treemap_is_read_only(store):
+    nodes = store.treemap(2024)
+    assert nodes is store.treemap(2024)
+    with pytest.raises(TypeError):
+        nodes['values'] = None
+    for array in nodes.values():
+        with pytest.raises(ValueError):
+            array[:1] = array[-1:]
+
+
+def test_treemap_copy_is_independent(store):
+    nodes = store.treemap(2024)
+    table = pd.DataFrame(dict(nodes))
+    table['values'] = 0
+    assert not np.shares_memory(table['values'].to_numpy(), nodes['values'])
+    assert (nodes['values'] > 0).all()
+
+
+def test_unit_types_are_read_only(store):
+    for cube in (store._members, store._members_rolled_up):
+        assert not cube.unit_types.flags.writeable
+
+
+def test_age_groups_batch(store):
+    years, _ = store.series()
+    kraje = [kraj for kraj, _ in store.options('kraj')][:3]
+    units = kraje + [None, 'unknown']
+    for rolled_up in (False, True):
+        batch = store.age_groups_batch(units, list(years) + [1900], rolled_up=rolled_up)
+        assert batch.shape == (len(units), len(years) + 1, len(store.age_group_labels))
+        for i, unit in enumerate(units):
+            for j, year in enumerate(years):
+                np.testing.assert_array_equal(batch[i, j], store.age_groups(unit, year, rolled_up=rolled_up))
+        assert not batch[:, -1].any() and not batch[-1].any()
@@ -0,0 +1,64 @@
+"""Encoding detection of the source CSVs."""
+import json
+
+import pytest
+
+from src.DataLoader import DataLoader, ENCODING_CACHE_FILE, MIN_CP1250_CONFIDENCE
+
+CZECH = 'RegistrationNumber;DisplayName\n111.01;Středisko Řehoř Žďár\n111.02;„Oddíl“ – Tábor Čáslav\n'
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'cp1250'])
+def test_czech_text(tmp_path, encoding):
+    path = tmp_path / 'O2_clenove_oddily_2024.csv'
+    path.write_text(CZECH * 20, encoding=encoding)
+    detected, confidence = DataLoader(str(tmp_path))._detect_encoding_uncached(str(path))
+    assert detected == encoding
+    assert MIN_CP1250_CONFIDENCE <= confidence <= 1.0
+    if encoding == 'cp1250':
+        assert confidence < 1.0
+
+
+@pytest.mark.parametrize('text, encoding', [
+    ('Name;Zahl\nMüller Straße Größe Übung;1\n', 'latin-1'),
+    ('Имя;Число\nПривет мир тест;1\n', 'cp1251'),
+])
+def test_other_8bit_text_is_not_cp1250(tmp_path, text, encoding):
+    path = tmp_path / 'V2_clenove_vyssi_2024.csv'
+    path.write_bytes((text * 50).encode(encoding))
+    detected, confidence = DataLoader(str(tmp_path))._detect_encoding_uncached(str(path))
+    assert detected.lower() not in ('cp1250', 'windows-1250')
+
+
+def test_old_cache_entries_are_detected_again(tmp_path):
+    path = tmp_path / 'O2_clenove_oddily_2024.csv'
+    path.write_text(CZECH, encoding='cp1250')
+    loader = DataLoader(str(tmp_path))
+    # Entry of the previous detection, without a version
+    (tmp_path / ENCODING_CACHE_FILE).write_text(json.dumps({
+        path.name: {'encoding': 'cp1250', 'confidence': 1.0, 'fingerprint': loader.file_fingerprint(str(path))},
+    }))
+    assert loader.detect_encoding(str(path)) == ('cp1250', 0.99)
+    assert DataLoader(str(tmp_path)).detect_encoding(str(path)) == ('cp1250', 0.99)
+
+
+def test_sample_may_end_in_a_utf8_sequence(tmp_path):
+    path = tmp_path / 'S2_clenove_strediska_2024.csv'
+    data = (CZECH * 20).encode('utf-8')
+    path.write_bytes(data)
+    # Cut right after the first byte of the two-byte 'ř'
+    max_bytes = data.index('ř'.encode('utf-8')) + 1
+    loader = DataLoader(str(tmp_path))
+    assert loader._detect_encoding_uncached(str(path), max_bytes=max_bytes) == ('utf-8', 1.0)
+    # Only the sample is checked, a file that is UTF-8 at its start is taken as UTF-8
+    path.write_bytes(data + 'Žďár'.encode('cp1250'))
+    assert loader._detect_encoding_uncached(str(path), max_bytes=len(data)) == ('utf-8', 1.0)
+
+
+def test_cache_entry_has_the_fingerprint(tmp_path):
+    path = tmp_path / 'O2_clenove_oddily_2024.csv'
+    path.write_text(CZECH, encoding='cp1250')
+    loader = DataLoader(str(tmp_path))
+    assert loader.detect_encoding(str(path)) == ('cp1250', 0.99)
+    entry = json.loads((tmp_path / ENCODING_CACHE_FILE).read_text())[path.name]
+    assert entry['fingerprint'] == loader.file_fingerprint(str(path))
@@ -0,0 +1,52 @@
+"""Sizing of the cached figures."""
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+import pytest
+
+from src import figure_cache
+from src.figure_cache import FigureCache, estimate_size
+
+
+def treemap(count):
+    ids = [f"all/Kraj {i % 14}/Okres Žďár {i}" for i in range(count)]
+    return go.Figure(go.Treemap(
+        ids=np.array(ids, dtype=object),
+        labels=np.array([f"Okres Žďár {i}" for i in range(count)], dtype=object),
+        parents=np.array([f"all/Kraj {i % 14}" for i in range(count)], dtype=object),
+        values=np.arange(count) * 37,
+        hovertemplate='<b>%{label}</b><br>Members: %{value}<extra></extra>',
+    ))
+
+
+FIGURES = {
+    'treemap': treemap(5),
+    'large treemap': treemap(5000),
+    'line': go.Figure(go.Scatter(x=np.arange(2016, 2025), y=np.linspace(0, 1, 9), mode='lines+markers'),
+                      layout={'title': 'Members / year'}),
+    'bar': go.Figure([go.Bar(x=['0-6', '7-15', '16-18'], y=[3, 14, 15], name=str(year)) for year in range(5)]),
+}
+
+
+@pytest.mark.parametrize('name', FIGURES)
+def test_estimate_is_close_to_json(name):
+    figure = FIGURES[name]
+    size = len(pio.to_json(figure, validate=False))
+    assert abs(estimate_size(figure) - size) <= 0.05 * size
+
+
+def test_disabled_cache_does_not_size(monkeypatch):
+    def fail(figure):
+        raise AssertionError("Sized a figure of a disabled cache")
+    monkeypatch.setattr(figure_cache, 'estimate_size', fail)
+    cache = FigureCache(max_bytes=0)
+    assert cache.get_or_build('key', lambda: FIGURES['line']) is FIGURES['line']
+    assert cache.stats()['entries'] == 0
+
+
+def test_evicts_least_recently_used():
+    size = estimate_size(FIGURES['line'])
+    cache = FigureCache(max_bytes=2 * size)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, FIGURES['line'])
+    assert cache.stats()['entries'] == 2 and cache.stats()['evictions'] == 1
@@ -0,0 +1,53 @@
+"""add_hierarchy_levels against the split/apply implementation it replaced."""
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from generate_data import generate_units
+from src.utils import add_hierarchy_levels
+
+EDGE_CASES = [
+    '', np.nan, None,
+    '110', '111', '111.', '111.01', '111.01.', '111.01.001', '111.01.001-', '111.01.001-01',
+    '111.01.001-01-02', '111.01.001-0a', '111.01.001-01.5', '111..001-01', '.01', '..', '-', '111-01',
+    '111.01.001.7-01', '111.01-02.001-03', '111.01.-01', '1', '11',
+]
+
+
+def split_apply_levels(df):
+    # The implementation before the single regex pass, kept as the reference
+    df['RegistrationNumber'] = df['RegistrationNumber'].fillna('').astype(str)
+    df['LevelKraj'] = df['RegistrationNumber'].str.split('.').apply(lambda x: x[0][:2] if len(x) > 0 else 'Unknown')
+    df['LevelOkres'] = df['RegistrationNumber'].str.split('.').apply(lambda x: x[0] if len(x) > 0 else 'Unknown')
+    df['LevelStredisko'] = df['RegistrationNumber'].str.split('.').apply(lambda x: x[1] if len(x) > 1 else 'Unknown')
+    df['LevelOddil'] = df['RegistrationNumber'].str.split('.').apply(
+        lambda x: x[2].split('-')[0] if len(x) > 2 and '-' in x[2] else 'Unknown'
+    )
+    df['LevelDruzina'] = df['RegistrationNumber'].str.extract(r'-(\d+)$', expand=False).fillna('Unknown')
+    return df
+
+
+def assert_same_levels(registration_numbers):
+    df = pd.DataFrame({'RegistrationNumber': registration_numbers, 'Year': 2024})
+    assert_frame_equal(add_hierarchy_levels(df.copy()), split_apply_levels(df.copy()))
+
+
+def test_generated_units():
+    units = generate_units(scale=1)
+    # Every unit repeats once per year in the merged data
+    assert_same_levels(pd.concat([units['RegistrationNumber']] * 3, ignore_index=True))
+
+
+@pytest.mark.parametrize('registration_number', EDGE_CASES)
+def test_edge_case(registration_number):
+    assert_same_levels([registration_number, '111.01.001-01'])
+
+
+def test_edge_cases_together():
+    assert_same_levels(EDGE_CASES * 2)
+
+
+def test_index_is_kept():
+    df = pd.DataFrame({'RegistrationNumber': ['111.01', '112', '111.01.001-01']}, index=[7, 3, 5])
+    assert list(add_hierarchy_levels(df)['LevelStredisko']) == ['01', 'Unknown', '01']
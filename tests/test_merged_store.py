@@ -0,0 +1,140 @@
+"""
+The partitioned merged store only parses new and changed source files and matches a full rebuild.
+Parsing in a process pool gives the same frames as parsing sequentially.
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import src.DataLoader
+from generate_data import generate_dataset
+from src.DataLoader import DataLoader, STORE_DIRECTORY, STORE_MANIFEST_FILE
+
+
+@pytest.fixture(scope='module')
+def generated(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('generated')
+    generate_dataset(str(directory), scale=0.2, years=3)
+    return directory
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Names of the files parsed by the loaders, in the order they were parsed."""
+    names = []
+    parse = src.DataLoader._parse_source_file
+
+    def counting_parse(filepath, *args):
+        names.append(os.path.basename(filepath))
+        return parse(filepath, *args)
+
+    monkeypatch.setattr(src.DataLoader, '_parse_source_file', counting_parse)
+    return names
+
+
+def copy_sources(generated, directory, years):
+    for name in sorted(os.listdir(generated)):
+        if int(name.split('_')[-1].split('.')[0]) in years:
+            shutil.copy(generated / name, directory / name)
+
+
+def load_store(directory):
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = DataLoader(str(directory))
+        loader.load_merged_store()
+    return loader.get_merged_dataframe()
+
+
+def full_rebuild(directory):
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = DataLoader(str(directory))
+        loader.load_all_csvs()
+        loader.normalize_and_merge()
+    return loader.get_merged_dataframe()
+
+
+def manifest(directory):
+    with open(directory / STORE_DIRECTORY / STORE_MANIFEST_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_new_year_parses_only_its_files(generated, tmp_path, parsed):
+    copy_sources(generated, tmp_path, {2023, 2024})
+    load_store(tmp_path)
+    assert len(parsed) == 6
+
+    parsed.clear()
+    copy_sources(generated, tmp_path, {2022})
+    merged = load_store(tmp_path)
+    assert sorted(parsed) == sorted(name for name in os.listdir(generated) if name.endswith('_2022.csv'))
+    pd.testing.assert_frame_equal(merged, full_rebuild(tmp_path))
+
+    # Nothing changed, nothing is parsed
+    parsed.clear()
+    pd.testing.assert_frame_equal(load_store(tmp_path), merged)
+    assert parsed == []
+
+
+def test_changed_file_is_parsed_again(generated, tmp_path, parsed):
+    copy_sources(generated, tmp_path, {2024})
+    load_store(tmp_path)
+    changed = next(name for name in os.listdir(tmp_path) if name.startswith('S2_'))
+    df = pd.read_csv(tmp_path / changed, dtype={'RegistrationNumber': str})
+    df.loc[0, 'RegularMembers'] += 1000
+    df.to_csv(tmp_path / changed, index=False)
+
+    parsed.clear()
+    merged = load_store(tmp_path)
+    assert parsed == [changed]
+    pd.testing.assert_frame_equal(merged, full_rebuild(tmp_path))
+    assert (merged['RegularMembers'] >= 1000).any()
+
+
+def test_removed_file_drops_its_partition(generated, tmp_path, parsed):
+    copy_sources(generated, tmp_path, {2023, 2024})
+    load_store(tmp_path)
+    removed = next(name for name in os.listdir(tmp_path) if name.startswith('O2_') and name.endswith('_2023.csv'))
+    partition = manifest(tmp_path)[removed]['partition']
+    os.remove(tmp_path / removed)
+
+    parsed.clear()
+    merged = load_store(tmp_path)
+    assert parsed == []
+    assert removed not in manifest(tmp_path)
+    assert not os.path.exists(tmp_path / STORE_DIRECTORY / partition)
+    pd.testing.assert_frame_equal(merged, full_rebuild(tmp_path))
+
+
+def test_partition_version_bump_parses_everything(generated, tmp_path, parsed, monkeypatch):
+    copy_sources(generated, tmp_path, {2024})
+    merged = load_store(tmp_path)
+
+    parsed.clear()
+    monkeypatch.setattr(src.DataLoader, 'PARTITION_VERSION', src.DataLoader.PARTITION_VERSION + 1)
+    pd.testing.assert_frame_equal(load_store(tmp_path), merged)
+    assert len(parsed) == 3
+
+
+def test_parallel_parsing_matches_sequential(generated, tmp_path):
+    loaders = {}
+    for workers in (1, 3):
+        # Fresh copies, so the encodings are detected in the workers as well
+        directory = tmp_path / f"workers_{workers}"
+        directory.mkdir()
+        copy_sources(generated, directory, {2022, 2023, 2024})
+        with contextlib.redirect_stdout(io.StringIO()):
+            loader = DataLoader(str(directory))
+            loader.load_all_csvs(workers=workers)
+            loader.normalize_and_merge()
+        loaders[workers] = loader
+    for dataset_type, frames in loaders[1].dataframes_by_type.items():
+        parallel = loaders[3].dataframes_by_type[dataset_type]
+        assert list(parallel) == list(frames)
+        for key, df in frames.items():
+            pd.testing.assert_frame_equal(parallel[key], df)
+    pd.testing.assert_frame_equal(loaders[3].get_merged_dataframe(), loaders[1].get_merged_dataframe())
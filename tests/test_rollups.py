@@ -0,0 +1,131 @@
+"""UnitYearCube.rolled_up sums the lowest units of every subtree, consistency_report flags contradictions."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.aggregates import UnitYearCube, consistency_report, subtree_ranges
+
+UNITS = [
+    ('000', 'ustredi'),
+    ('110', 'kraj'),
+    ('111', 'okres'),
+    ('111.01', 'stredisko'),
+    ('111.01.001', 'oddil'),
+    ('111.01.001-01', 'druzina'),
+    ('111.01.001-02', 'druzina'),
+    ('111.01.002', 'oddil'),
+    ('111.02', 'stredisko'),
+    ('112', 'okres'),
+    ('120', 'kraj'),
+    ('121', 'okres'),
+    ('121.01', 'stredisko'),
+    ('800.01', 'zvlastniJednotka'),
+    ('800.01.001', 'oddil'),
+]
+
+
+def is_below(number, unit_type, other):
+    """Whether the unit other is in the subtree of the unit number, from the registration number scheme."""
+    if unit_type == 'ustredi':
+        return True
+    if unit_type == 'kraj':
+        return other[:2] == number[:2]
+    return other == number or other.startswith(number + '.') or other.startswith(number + '-')
+
+
+def brute_force_rolled_up(cube):
+    """Sum of the values of the units with a row and without any row below them, per subtree and year."""
+    numbers = list(cube.units)
+    subtrees = [[j for j, other in enumerate(numbers) if is_below(number, unit_type, other)]
+                for number, unit_type in zip(numbers, cube.unit_types)]
+    values = np.zeros_like(cube.values)
+    for year in range(len(cube.years)):
+        leaves = [i for i in range(len(numbers))
+                  if cube.present[i, year] and not any(cube.present[j, year] for j in subtrees[i] if j != i)]
+        for i, subtree in enumerate(subtrees):
+            values[i, year] = cube.values[[j for j in subtree if j in leaves], year].sum(axis=0)
+    return values
+
+
+@pytest.fixture(scope='module')
+def units():
+    return pd.DataFrame(UNITS, columns=['RegistrationNumber', 'ID_UnitType'])
+
+
+@pytest.fixture(scope='module')
+def cube(units):
+    # Every unit reports its own members plus the rows below it. 2022: no druziny, 2023: all units,
+    # 2024: druzina -02 and stredisko 111.01 have no row, oddil 111.01.001 one leader less than its druzina
+    own = dict(zip(units['RegistrationNumber'], range(1, len(units) + 1)))
+    rows = []
+    for year, missing in ((2022, {'111.01.001-01', '111.01.001-02'}), (2023, set()),
+                          (2024, {'111.01.001-02', '111.01'})):
+        present = [number for number in own if number not in missing]
+        for number, unit_type in UNITS:
+            if number in missing:
+                continue
+            below = [other for other in present if other != number and is_below(number, unit_type, other)]
+            members = own[number] + sum(own[other] for other in below)
+            if year == 2024 and number == '111.01.001':
+                members = own['111.01.001-01'] - 1
+            rows.append((number, f"Unit {number}", unit_type, year, members))
+    df = pd.DataFrame(rows, columns=['RegistrationNumber', 'UnitName', 'ID_UnitType', 'Year', 'RegularMembers'])
+    return UnitYearCube(df.sample(frac=1, random_state=0), ['RegularMembers'])
+
+
+def test_subtree_ranges(units):
+    numbers = units['RegistrationNumber'].to_numpy()
+    order, starts, ends = subtree_ranges(numbers, units['ID_UnitType'].to_numpy())
+    for i, (number, unit_type) in enumerate(UNITS):
+        subtree = set(numbers[order[starts[i]:ends[i]]])
+        assert subtree == {other for other in numbers if is_below(number, unit_type, other)}, number
+    subtree_of = {number: set(numbers[order[starts[i]:ends[i]]]) for i, number in enumerate(numbers)}
+    assert subtree_of['000'] == set(numbers)
+    assert subtree_of['110'] == {'110', '111', '111.01', '111.01.001', '111.01.001-01', '111.01.001-02',
+                                 '111.01.002', '111.02', '112'}
+    assert subtree_of['800.01'] == {'800.01', '800.01.001'}
+    assert subtree_of['111.01.001-01'] == {'111.01.001-01'}
+
+
+def test_rolled_up_matches_brute_force(cube):
+    rolled_up = cube.rolled_up()
+    np.testing.assert_array_equal(rolled_up.values, brute_force_rolled_up(cube))
+    np.testing.assert_array_equal(rolled_up.totals, rolled_up.values[cube.unit_index('000')])
+    # The reported values are left alone
+    assert rolled_up.present is cube.present
+    assert not np.array_equal(rolled_up.values, cube.values)
+
+
+def test_missing_children(cube):
+    rolled_up = cube.rolled_up()
+
+    def value(number, year):
+        return rolled_up.values[cube.unit_index(number), cube.year_index(year), 0]
+
+    def reported(number, year):
+        return cube.values[cube.unit_index(number), cube.year_index(year), 0]
+
+    # Without druziny the oddil is the lowest unit, with one of them the druzina replaces it
+    assert value('111.01.001', 2022) == reported('111.01.001', 2022)
+    assert value('111.01.001', 2023) == reported('111.01.001-01', 2023) + reported('111.01.001-02', 2023)
+    assert value('111.01.001', 2024) == reported('111.01.001-01', 2024)
+    # A missing stredisko does not cut its oddily off the okres
+    assert value('111', 2024) == (reported('111.01.001-01', 2024) + reported('111.01.002', 2024)
+                                  + reported('111.02', 2024))
+    assert value('800.01', 2023) == reported('800.01.001', 2023)
+
+
+def test_consistency_report_flags_contradictions(cube):
+    report = consistency_report(cube, cube.rolled_up())
+    # Every parent reports its own leaders on top of its lowest units, only the oddil of 2024 reports less
+    assert list(zip(report['RegistrationNumber'], report['Year'])) == [('111.01.001', 2024)]
+    assert report['Difference'].iloc[0] == 1
+    assert consistency_report(cube, cube.rolled_up(), tolerance=1.0).empty
+
+
+def test_generated_data_is_consistent(dataset):
+    cube = UnitYearCube(dataset, ['RegularMembers'])
+    rolled_up = cube.rolled_up()
+    assert (rolled_up.values[cube.present] <= cube.values[cube.present]).all()
+    assert (rolled_up.values[cube.present] < cube.values[cube.present]).any()
+    assert consistency_report(cube, rolled_up).empty
@@ -0,0 +1,58 @@
+"""limit_treemap_nodes keeps the treemap under the node budget."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.aggregates import limit_treemap_nodes, treemap_nodes
+
+PATH = ['Kraj', 'Okres', 'Stredisko', 'Oddil']
+
+
+@pytest.fixture(scope='module')
+def nodes():
+    # 4 kraje with 1-5 okresy, 1-6 strediska and 1-4 oddily each, random sizes
+    rng = np.random.default_rng(0)
+    rows = []
+    for kraj in range(4):
+        for okres in range(rng.integers(1, 6)):
+            for stredisko in range(rng.integers(1, 7)):
+                for oddil in range(rng.integers(1, 5)):
+                    rows.append((f"k{kraj}", f"o{okres}", f"s{stredisko}", f"d{oddil}", rng.integers(1, 100)))
+    df = pd.DataFrame(rows, columns=PATH + ['RegularMembers'])
+    df['UnitName'] = df['Oddil']
+    return treemap_nodes(df, PATH, 'RegularMembers', 'UnitName')
+
+
+def assert_valid(result, nodes):
+    ids = set(result['ids'])
+    assert result['ids'].is_unique
+    assert all(parent == '' or parent in ids for parent in result['parents'])
+    # Every "other" node replaces at least two nodes
+    assert not (result['names'] == '1 smaller units').any()
+    # Shown children never sum to more than their parent
+    values = result.set_index('ids')['values']
+    children = result[result['parents'] != ''].groupby('parents')['values'].sum()
+    assert (children <= values[children.index] + 1e-9).all()
+    assert result.loc[result['depth'] == 0, 'values'].iloc[0] == nodes.loc[nodes['depth'] == 0, 'values'].iloc[0]
+
+
+def test_without_budget(nodes):
+    result = limit_treemap_nodes(nodes, default_depth=4)
+    assert len(result) == len(nodes)
+
+
+@pytest.mark.parametrize('node_budget', [5, 10, 20, 40, 80, 150])
+def test_budget_is_respected(nodes, node_budget):
+    result = limit_treemap_nodes(nodes, default_depth=4, node_budget=node_budget)
+    assert len(result) <= node_budget
+    assert_valid(result, nodes)
+
+
+@pytest.mark.parametrize('node_budget', [10, 20, 40])
+def test_focus_is_kept(nodes, node_budget):
+    focus_id = nodes.loc[nodes['depth'] == 3, 'ids'].iloc[0]
+    result = limit_treemap_nodes(nodes, focus_id, default_depth=2, node_budget=node_budget)
+    assert len(result) <= node_budget
+    parts = focus_id.split('/')
+    assert {'/'.join(parts[:i]) for i in range(1, len(parts) + 1)} <= set(result['ids'])
+    assert_valid(result, nodes)